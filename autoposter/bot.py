@@ -1,79 +1,652 @@
 """
-Takes the top 3 Google News and posts them to Reddit.
+Takes the top Google News of several searches and posts them to Reddit.
 """
 
-import xml.etree.ElementTree as ET
-
-import praw
-import requests
+import hashlib
+import os
+import re
+import struct
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 import config
+import feeds
+import metrics
+import redditclient
+import writequeue
+
+LOG_FILE = "./processed.log"
+TITLES_FILE = "./titles.log"
+LEGACY_LOG_FILE = "./processed_urls.txt"
+NEWS_URL = "https://news.google.com/rss/search?q={}+when:1d&hl=es-419&gl=MX"
+
+# Each route is a Google News search, the subreddit to post to and
+# how many of the top links to post.
+ROUTES = [
+    ("ecatepec", config.SUBREDDIT, 3)
+]
+
+# The max number of feeds downloaded at the same time.
+MAX_WORKERS = 4
+
+# Entries older than this many seconds or beyond this count are evicted.
+LOG_MAX_AGE = 60 * 60 * 24 * 180
+LOG_MAX_ENTRIES = 20000
+
+# Titles at least this similar (0 to 1) to a recently posted one are skipped,
+# titles are only compared against the ones posted in the last TITLES_MAX_AGE seconds.
+SIMILARITY_THRESHOLD = 0.5
+TITLES_MAX_AGE = 60 * 60 * 24 * 7
+TITLES_MAX_ENTRIES = 2000
+
+# Titles are split into overlapping character shingles of this size and
+# summarized by a MinHash signature of NUM_HASHES values. The signature is
+# split into bands, only titles that share at least one band are compared
+# and their exact similarity is checked. The band size is derived from
+# SIMILARITY_THRESHOLD so titles at the threshold are compared at least
+# MIN_RECALL of the time, see get_band_rows().
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+MIN_RECALL = 0.9
+
+# Each shingle is hashed once with SHAKE-128, its output is read as
+# NUM_HASHES independent 32 bit hashes.
+SIGNATURE_FORMAT = "<{}I".format(NUM_HASHES)
+SIGNATURE_SIZE = struct.calcsize(SIGNATURE_FORMAT)
 
-LOG_FILE = "./processed_urls.txt"
-NEWS_URL = "https://news.google.com/rss/search?q=ecatepec+when:1d&hl=es-419&gl=MX"
+
+def make_key(value, subreddit=None):
+    """Hashes a url or title into a fixed size log key.
+
+    Parameters
+    ----------
+    value : str
+        The url or title to hash.
+
+    subreddit : str
+        The subreddit it was posted to. Keys logged before the routes
+        shared a log have no subreddit.
+
+    Returns
+    -------
+    str
+        A 32 characters hex digest.
+
+    """
+
+    if subreddit is not None:
+        value = "{}\n{}".format(subreddit.lower(), value)
+
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
 
 
 def load_log():
-    """Loads the log file and creates it if it doesn't exist.
+    """Loads the log file, evicts old entries and creates it if it doesn't exist.
+
+    Each line of the log file contains a UNIX timestamp and a hashed
+    url or title separated by a tab. Incomplete lines left by a crash
+    are ignored.
 
     Returns
     -------
-    list
-        A list of urls.
+    dict
+        A dict of hashed urls and titles and the time they were logged.
 
     """
 
+    log = dict()
+
     try:
         with open(LOG_FILE, "r", encoding="utf-8") as temp_file:
-            return temp_file.read().splitlines()
+            for line in temp_file:
+                fields = line.rstrip("\n").split("\t")
+
+                if len(fields) == 2 and len(fields[1]) == 32:
+                    try:
+                        log[fields[1]] = float(fields[0])
+                    except ValueError:
+                        continue
+
+    except FileNotFoundError:
+        migrate_log(log)
+
+    # Drop the expired entries and keep only the newest ones.
+    min_time = time.time() - LOG_MAX_AGE
+    entries = sorted(((v, k) for k, v in log.items() if v >= min_time), reverse=True)
+    entries = entries[:LOG_MAX_ENTRIES]
+
+    if len(entries) != len(log) or not os.path.exists(LOG_FILE):
+        log = {k: v for v, k in entries}
+        save_log(log)
+
+    return log
+
+
+def migrate_log(log):
+    """Imports the urls and titles from the old plain text log.
+
+    The old log belonged to a single bot that posted to config.SUBREDDIT.
+
+    Parameters
+    ----------
+    log : dict
+        The log dict to fill.
+
+    """
+
+    now = time.time()
+
+    try:
+        with open(LEGACY_LOG_FILE, "r", encoding="utf-8") as temp_file:
+            for line in temp_file.read().splitlines():
+                if line:
+                    log[make_key(line, config.SUBREDDIT)] = now
 
     except FileNotFoundError:
-        with open(LOG_FILE, "w", encoding="utf-8") as temp_file:
-            return []
+        pass
+
 
+def save_log(log):
+    """Rewrites the whole log file.
 
-def update_log(url):
+    The new contents are written to a temporary file which then replaces
+    the log file, this way a crash never leaves a half written log.
+
+    Parameters
+    ----------
+    log : dict
+        A dict of hashed urls and titles and the time they were logged.
+
+    """
+
+    temp_name = LOG_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        for k, v in sorted(log.items(), key=lambda item: item[1]):
+            temp_file.write("{}\t{}\n".format(v, k))
+
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+    os.replace(temp_name, LOG_FILE)
+
+
+def update_log(log, value, subreddit):
     """Updates the log file.
 
+    Parameters
+    ----------
+    log : dict
+        The log dict returned by load_log().
+
+    value : str
+        The url or title to log.
+
+    subreddit : str
+        The subreddit it was posted to.
+
+    """
+
+    key = make_key(value, subreddit)
+    now = time.time()
+
+    append_line(LOG_FILE, "{}\t{}".format(now, key))
+
+    log[key] = now
+
+
+def append_line(file_name, line):
+    """Appends a line to a file and waits until it's on disk.
+
+    If a crash left an incomplete last line it is ended first, this way
+    only the incomplete line is lost and not the new one.
+
+    Parameters
+    ----------
+    file_name : str
+        The file to append to.
+
+    line : str
+        The line without its line break.
+
+    """
+
+    with open(file_name, "a+b") as temp_file:
+        temp_file.seek(0, os.SEEK_END)
+
+        if temp_file.tell() > 0:
+            temp_file.seek(-1, os.SEEK_END)
+
+            if temp_file.read(1) != b"\n":
+                line = "\n" + line
+
+        temp_file.write((line + "\n").encode("utf-8"))
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+
+def is_logged(log, value, subreddit):
+    """Checks if a url or title was already posted to a subreddit.
+
+    Parameters
+    ----------
+    log : dict
+        The log dict returned by load_log().
+
+    value : str
+        The url or title to check.
+
+    subreddit : str
+        The subreddit to post to.
+
+    Returns
+    -------
+    bool
+        True if it was logged for the subreddit. Keys logged without a
+        subreddit by older versions count for every subreddit until they
+        expire.
+
+    """
+
+    return make_key(value, subreddit) in log or make_key(value) in log
+
+
+def normalize_title(title):
+    """Lowercases a title and removes its accents and punctuation.
+
+    Parameters
+    ----------
+    title : str
+        The title to normalize.
+
+    Returns
+    -------
+    str
+        The words of the title separated by single spaces.
+
+    """
+
+    title = unicodedata.normalize("NFKD", title.lower())
+    title = "".join(char for char in title if not unicodedata.combining(char))
+
+    return " ".join(re.findall(r"\w+", title))
+
+
+def get_shingles(title):
+    """Splits a title into overlapping character shingles.
+
+    Parameters
+    ----------
+    title : str
+        The title, it is normalized first.
+
+    Returns
+    -------
+    frozenset
+        The shingles of SHINGLE_SIZE characters.
+
+    """
+
+    title = normalize_title(title)
+
+    return frozenset(title[i:i + SHINGLE_SIZE]
+                     for i in range(max(len(title) - SHINGLE_SIZE + 1, 1)))
+
+
+def get_signature(shingles):
+    """Computes the MinHash signature of a set of shingles.
+
+    Parameters
+    ----------
+    shingles : frozenset
+        The value returned by get_shingles().
+
+    Returns
+    -------
+    bytes
+        NUM_HASHES packed integers, the fraction of equal values between
+        two signatures estimates the Jaccard similarity of their shingles.
+
+    """
+
+    hashes = [struct.unpack(SIGNATURE_FORMAT,
+                            hashlib.shake_128(shingle.encode("utf-8")).digest(SIGNATURE_SIZE))
+              for shingle in shingles]
+
+    return struct.pack(SIGNATURE_FORMAT, *map(min, zip(*hashes)))
+
+
+def get_band_rows(threshold):
+    """Gets how many signature values go in each band for a similarity threshold.
+
+    Two titles with a similarity s share at least one of b bands of r
+    values with a probability of 1 - (1 - s^r)^b. Larger bands make fewer
+    useless comparisons, the largest band that still compares titles at
+    the threshold at least MIN_RECALL of the time is used. With the
+    default threshold of 0.5 that's 21 bands of 3 values, titles at 0.5
+    are compared 94% of the time, at 0.6 99.4% and at 0.2 only 15%. Bands
+    of 2 values compare most of the indexed titles, see
+    benchmarks/bench_titles.py for the measured comparisons and recall.
+
+    Parameters
+    ----------
+    threshold : float
+        The similarity threshold.
+
+    Returns
+    -------
+    int
+        The number of values per band.
+
+    """
+
+    for rows in range(NUM_HASHES, 1, -1):
+        bands = NUM_HASHES // rows
+
+        if 1 - (1 - threshold ** rows) ** bands >= MIN_RECALL:
+            return rows
+
+    return 1
+
+
+class TitleIndex:
+    """Finds titles similar to the recently posted ones without comparing against all of them.
+
+    Each band of a signature is a key of a dict of buckets, a title is
+    only compared against the titles found in the buckets of its bands.
+    The shingles of the indexed titles are only computed when they are
+    compared.
+
+    Parameters
+    ----------
+    threshold : float
+        The similarity threshold the bands are sized for.
+
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.rows = get_band_rows(threshold)
+        self.shingles = dict()
+        self.buckets = dict()
+
+    def add(self, title, signature=None):
+        """Adds a title to the index.
+
+        Parameters
+        ----------
+        title : str
+            The title to add.
+
+        signature : bytes
+            Its signature if it's already known.
+
+        """
+
+        if signature is None:
+            signature = get_signature(get_shingles(title))
+
+        for band in self.get_bands(signature):
+            self.buckets.setdefault(band, set()).add(title)
+
+    def find(self, title):
+        """Finds the most similar indexed title.
+
+        Parameters
+        ----------
+        title : str
+            The title to look for.
+
+        Returns
+        -------
+        tuple
+            The indexed title and the Jaccard similarity of their shingles,
+            (None, 0.0) if no indexed title shares a band with it.
+
+        """
+
+        shingles = get_shingles(title)
+
+        candidates = set()
+
+        for band in self.get_bands(get_signature(shingles)):
+            candidates.update(self.buckets.get(band, ()))
+
+        best = (None, 0.0)
+
+        # The candidates are few, their exact similarity is checked.
+        for candidate in candidates:
+            if candidate not in self.shingles:
+                self.shingles[candidate] = get_shingles(candidate)
+
+            other = self.shingles[candidate]
+            similarity = len(shingles & other) / len(shingles | other)
+
+            if similarity > best[1]:
+                best = (candidate, similarity)
+
+        return best
+
+    def get_bands(self, signature):
+        """Splits a signature into (band number, packed values) keys."""
+
+        size = SIGNATURE_SIZE // NUM_HASHES * self.rows
+
+        return [(i, signature[i:i + size])
+                for i in range(0, SIGNATURE_SIZE - size + 1, size)]
+
+
+def load_titles():
+    """Loads the recently posted titles into an index per subreddit, expired entries are evicted.
+
+    Each line of the titles file contains a UNIX timestamp, the subreddit,
+    a title and its signature in hex separated by tabs, this way the
+    titles aren't hashed again on every run. Incomplete lines left by a
+    crash are ignored, titles without a valid signature (cut by a crash
+    or written by a previous version) are hashed and the file is
+    rewritten with their signatures.
+
+    Returns
+    -------
+    dict
+        A dict of subreddits and the TitleIndex of the titles posted to
+        them in the last TITLES_MAX_AGE seconds.
+
+    """
+
+    titles = list()
+
+    try:
+        with open(TITLES_FILE, "r", encoding="utf-8") as temp_file:
+            for line in temp_file:
+                fields = line.rstrip("\n").split("\t")
+
+                if len(fields) < 3 or not fields[2]:
+                    continue
+
+                try:
+                    posted_at = float(fields[0])
+                except ValueError:
+                    continue
+
+                try:
+                    signature = bytes.fromhex(fields[3])
+                except (IndexError, ValueError):
+                    signature = None
+
+                titles.append((posted_at, fields[1], fields[2], signature))
+
+    except FileNotFoundError:
+        pass
+
+    # Drop the expired entries and keep only the newest ones.
+    min_time = time.time() - TITLES_MAX_AGE
+    entries = sorted((entry for entry in titles if entry[0] >= min_time),
+                     key=lambda entry: entry[0], reverse=True)
+    entries = entries[:TITLES_MAX_ENTRIES]
+
+    hashed = list()
+
+    for posted_at, subreddit, title, signature in entries:
+        if signature is None or len(signature) != SIGNATURE_SIZE:
+            signature = get_signature(get_shingles(title))
+
+        hashed.append((posted_at, subreddit, title, signature))
+
+    if len(entries) != len(titles) or hashed != entries:
+        temp_name = TITLES_FILE + ".tmp"
+
+        with open(temp_name, "w", encoding="utf-8") as temp_file:
+            for posted_at, subreddit, title, signature in reversed(hashed):
+                temp_file.write("{}\t{}\t{}\t{}\n".format(
+                    posted_at, subreddit, title, signature.hex()))
+
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_name, TITLES_FILE)
+
+    indexes = dict()
+
+    for _, subreddit, title, signature in hashed:
+        indexes.setdefault(subreddit.lower(), TitleIndex()).add(title, signature)
+
+    return indexes
+
+
+def update_titles(indexes, subreddit, title):
+    """Appends a posted title to the titles file and the index of its subreddit.
+
+    Parameters
+    ----------
+    indexes : dict
+        The dict returned by load_titles().
+
+    subreddit : str
+        The subreddit it was posted to.
+
+    title : str
+        The posted title.
+
+    """
+
+    title = title.replace("\t", " ")
+    signature = get_signature(get_shingles(title))
+
+    append_line(TITLES_FILE, "{}\t{}\t{}\t{}".format(
+        time.time(), subreddit, title, signature.hex()))
+
+    indexes.setdefault(subreddit.lower(), TitleIndex()).add(title, signature)
+
+
+def fetch_feed(url, limit, state):
+    """Reads a feed without stopping the other routes if it fails.
+
     Parameters
     ----------
     url : str
-        The url to log.
+        The feed url.
+
+    limit : int
+        The max number of links to read.
+
+    state : dict
+        The feeds state.
+
+    Returns
+    -------
+    list
+        A list of feeds.Item, empty if the feed couldn't be read.
 
     """
 
-    with open(LOG_FILE, "a", encoding="utf-8") as temp_file:
-        temp_file.write(url + "\n")
+    feed_state = dict(state.get(url, {}))
+
+    try:
+        with metrics.timer("feed_read"):
+            return feeds.read_feed(url, limit, state)
+    except Exception as error:
+        # Restore the previous state so the feed is fully read next time.
+        state[url] = feed_state
+        metrics.count("feed_failed")
+        print("Failed:", url, error)
+        return []
 
 
 def init_bot():
-    """Reads the RSS feed."""
+    """Reads the RSS feeds of all the routes."""
+
+    # We get the shared Reddit instance.
+    reddit = redditclient.get_reddit()
+
+    log = load_log()
+    titles = load_titles()
+    state = feeds.load_state()
+
+    # Routes with the same search share one download.
+    limits = dict()
+
+    for query, _, top in ROUTES:
+        url = NEWS_URL.format(query)
+        limits[url] = max(top, limits.get(url, 0))
+
+    # All the feeds are downloaded at the same time, only reading the top links
+    # and keeping the ones we haven't seen before.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = dict(zip(limits, executor.map(
+            lambda url: fetch_feed(url, limits[url], state), limits)))
+
+    # The params of each pending write, so we know what each result was.
+    # Submissions left by a previous run are not queued again.
+    pending_writes = writequeue.load_pending()
+    writes = {write["key"]: write["params"] for write in pending_writes}
+
+    # Titles waiting to be posted also count as recent, this way the same
+    # story from another outlet isn't queued in this run either.
+    recent = dict()
+
+    for write in pending_writes:
+        if write["action"] == "submit":
+            params = write["params"]
+            recent.setdefault(params["subreddit"].lower(), TitleIndex()).add(params["title"])
+
+    for query, subreddit, top in ROUTES:
+
+        for item in results[NEWS_URL.format(query)][:top]:
+
+            title = item.title.split(" - ")[0].split(" | ")[0].strip()
+            url = item.link
+            key = "submit/{}".format(make_key(url, subreddit))
 
-    # We create the Reddit instance.
-    reddit = praw.Reddit(client_id=config.APP_ID, client_secret=config.APP_SECRET,
-                         user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
-                         password=config.REDDIT_PASSWORD)
+            if is_logged(log, url, subreddit) or is_logged(log, title, subreddit) or key in writes:
+                continue
 
-    with requests.get(NEWS_URL) as response:
+            for indexes in (titles, recent):
+                similar, similarity = indexes.get(subreddit.lower(), TitleIndex()).find(title)
 
-        root = ET.fromstring(response.text)
+                if similarity >= SIMILARITY_THRESHOLD:
+                    metrics.count("near_duplicate")
+                    print("Skipped:", title, "is similar to", similar,
+                          "({:.0%})".format(similarity))
+                    break
+            else:
+                writequeue.enqueue(key, "submit", subreddit=subreddit, title=title, url=url)
+                writes[key] = {"subreddit": subreddit, "title": title, "url": url}
+                recent.setdefault(subreddit.lower(), TitleIndex()).add(title)
 
-        # Only read the first 3 links.
-        for item in root.findall(".//item")[:3]:
-            
-            log = load_log()
+    results, _ = writequeue.flush(reddit)
 
-            title = item.find("title").text.split(" - ")[0].split(" | ")[0].strip()
-            url = item.find("link").text
+    for key in results:
 
-            if url not in log and title not in log:
+        params = writes.get(key)
 
-                reddit.subreddit(config.SUBREDDIT).submit(
-                    title=title, url=url)
+        if params is not None and params.get("url") is not None:
+            update_log(log, params["url"], params["subreddit"])
+            update_log(log, params["title"], params["subreddit"])
+            update_titles(titles, params["subreddit"], params["title"])
+            print("Posted:", params["url"], "to", params["subreddit"])
 
-                update_log(url)
-                update_log(title)
-                print("Posted:", url)
+    feeds.save_state(state)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+"""
+Compares the in-memory, read only Banxico workbook extraction against
+saving the file to disk and opening it with a full load_workbook.
+
+A recorded Banxico workbook can be passed as the first argument,
+otherwise a workbook with a similar layout is generated.
+
+python3 bench_banxico.py [banxico.xlsx]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "financebot"))
+
+import bot
+
+ROWS = [23, 25, 26, 27, 29, 30, 32, 33, 34]
+REPEATS = 20
+
+
+def make_workbook(rows=60, columns=120):
+    """Generates a workbook with a title area and a table of values."""
+
+    book = Workbook()
+    sheet = book.active
+
+    for row in range(1, 10):
+        sheet.cell(row=row, column=1, value="Banco de México - Encabezado {}".format(row))
+
+    for row in range(10, rows + 1):
+        sheet.cell(row=row, column=1, value="Instrumento {}".format(row))
+
+        for column in range(2, columns + 1):
+            value = "N/E" if (row + column) % 3 == 0 else round(4 + row / 100 + column / 1000, 4)
+            sheet.cell(row=row, column=column, value=value)
+
+    output = BytesIO()
+    book.save(output)
+
+    return output.getvalue()
+
+
+def full_load(content):
+    """The previous approach, writes the file and loads the whole workbook."""
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "banxico.xlsx")
+
+        with open(path, "wb") as temp_file:
+            temp_file.write(content)
+
+        sheet = load_workbook(path).worksheets[0]
+        values = dict()
+
+        for row_number in ROWS:
+            for column in (5, 4, 3, 2):
+                if sheet.cell(row=row_number, column=column).value != "N/E":
+                    values[row_number] = sheet.cell(row=row_number, column=column).value
+                    break
+
+        return values
+
+
+def read_only_load(content):
+    """The new approach, reads only the needed rows from memory."""
+
+    return bot.read_rows(content, ROWS)
+
+
+def measure(func, content):
+    """Returns the average time in milliseconds and the peak memory in KiB."""
+
+    start = time.perf_counter()
+
+    for _ in range(REPEATS):
+        func(content)
+
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+
+    tracemalloc.start()
+    func(content)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as temp_file:
+            content = temp_file.read()
+    else:
+        content = make_workbook()
+
+    # Both approaches must return the same values, read_rows also returns their
+    # dates and leaves out the rows past the end of the sheet.
+    rows = read_only_load(content)
+    assert full_load(content) == {row: rows.get(row, (None, None))[1] for row in ROWS}
+
+    print("Workbook size: {:,} bytes\n".format(len(content)))
+    print("| Method | Time (ms) | Peak memory (KiB) |")
+    print("| -- | -- | -- |")
+
+    for name, func in (("file + load_workbook", full_load), ("read_rows", read_only_load)):
+        elapsed, peak = measure(func, content)
+        print("| {} | {:.2f} | {:,.1f} |".format(name, elapsed, peak))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,117 @@
+"""
+Compares the indexed country lookup of the international epidemiology
+table against the previous row by country substring search.
+
+A saved copy of the Wikipedia template page can be passed as the first
+argument, otherwise a table with a similar layout is generated.
+
+python3 bench_coronabot.py [pandemic_data.html]
+"""
+
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "coronabot"))
+
+import bot
+
+REPEATS = 5
+
+ROW_TEMPLATE = """<tr><th scope="row"><span class="flagicon"><img src="flag.png"></span></th>
+<th scope="row"><a href="/wiki/{0}">{0}</a><sup>[{1}]</sup></th><td>{1}</td><td>{1}</td>
+<td>{2:,}</td><td>{3:,}</td><td>{1:,}</td><td><sup>[{1}]</sup></td></tr>
+"""
+
+
+def make_page(rows=230):
+    """Generates a page with a wikitable similar to the pandemic data template."""
+
+    names = list(bot.COUNTRIES.keys()) + ["Country {}".format(i) for i in range(rows)]
+    body = "".join(ROW_TEMPLATE.format(name, i, 100000 + i * 37, 1000 + i)
+                   for i, name in enumerate(names[:rows]))
+
+    return ("<html><body><table class=\"wikitable\"><tr><th>Location</th><th>Cases</th></tr>"
+            "<tr><th></th><th>World</th><td></td><td></td><td>9,999,999</td><td>99,999</td></tr>"
+            + body + "</table></body></html>")
+
+
+def substring_parse(html):
+    """The previous approach, searches every country in the text of every row."""
+
+    countries = dict(bot.COUNTRIES, **{"China (mainland)": "China"})
+    table_text = ""
+
+    soup = BeautifulSoup(html.replace("–", "0").replace(
+        "—", "0").replace("No data", "0"), "html.parser")
+
+    [tag.extract() for tag in soup("sup")]
+
+    for row in soup.find("table", "wikitable").find_all("tr"):
+
+        for k, v in countries.items():
+
+            if k in row.text.strip():
+                tds = row.find_all("td")
+
+                cases = int(tds[2].text.replace(",", "").strip())
+                deaths = int(tds[3].text.replace(",", "").strip())
+
+                table_text += "| {} | {:,} | {:,} ^{}% |\n".format(
+                    v,
+                    cases,
+                    deaths,
+                    round(deaths / cases * 100, 2)
+                )
+
+                break
+
+    return table_text
+
+
+def indexed_parse(html):
+    """The new approach, looks up the country cells in an index."""
+
+    # The header and totals rows are not part of the comparison.
+    return "".join(bot.render_international(
+        bot.parse_international_epidemiology(html)).splitlines(True)[2:-1])
+
+
+def measure(func, html):
+    """Returns the average CPU time in milliseconds."""
+
+    start = time.process_time()
+
+    for _ in range(REPEATS):
+        func(html)
+
+    return (time.process_time() - start) / REPEATS * 1000
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as temp_file:
+            html = temp_file.read()
+    else:
+        html = make_page()
+
+    if substring_parse(html) != indexed_parse(html):
+        print("Warning: the tables are different, the substring search also matches"
+              " rows like 'United States Virgin Islands'.\n")
+
+    print("| Method | CPU time (ms) |")
+    print("| -- | -- |")
+
+    for name, func in (("substring search", substring_parse), ("country index", indexed_parse)):
+        print("| {} | {:.1f} |".format(name, measure(func, html)))
+
+
+if __name__ == "__main__":
+
+    main()
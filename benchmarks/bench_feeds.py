@@ -0,0 +1,99 @@
+"""
+Compares the streaming RSS parser against the full ElementTree parse.
+
+A recorded feed can be passed as the first argument, otherwise a feed
+similar to the ones returned by Google News is generated.
+
+python3 bench_feeds.py [feed.xml]
+"""
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import feeds
+
+ITEM_TEMPLATE = """<item><title>Noticia número {0} sobre Ecatepec - Periódico {0}</title>
+<link>https://news.google.com/rss/articles/{0:064d}?oc=5</link>
+<guid isPermaLink="false">{0:064d}</guid>
+<pubDate>Mon, 06 Jan 2020 {1:02d}:00:00 GMT</pubDate>
+<description>&lt;a href="https://news.google.com/rss/articles/{0:064d}"&gt;Noticia {0}&lt;/a&gt;</description>
+<source url="https://periodico{0}.com.mx">Periódico {0}</source></item>
+"""
+
+REPEATS = 200
+
+
+def make_feed(items=100):
+    """Generates a RSS document with the given number of items."""
+
+    body = "".join(ITEM_TEMPLATE.format(i, i % 24) for i in range(items))
+
+    return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel>"
+            "<title>Google News</title>" + body + "</channel></rss>").encode("utf-8")
+
+
+def full_parse(data, limit):
+    """The previous approach, parses the whole document."""
+
+    root = ET.fromstring(data.decode("utf-8"))
+
+    return [(item.find("title").text, item.find("link").text)
+            for item in root.findall(".//item")[:limit]]
+
+
+def streaming_parse(data, limit):
+    """The streaming approach, stops after the requested items."""
+
+    return [(item.title, item.link) for item in feeds.iter_items(io.BytesIO(data), limit)]
+
+
+def measure(func, data, limit):
+    """Returns the average time in milliseconds and the peak memory in KiB."""
+
+    start = time.perf_counter()
+
+    for _ in range(REPEATS):
+        func(data, limit)
+
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+
+    tracemalloc.start()
+    func(data, limit)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as temp_file:
+            data = temp_file.read()
+    else:
+        data = make_feed()
+
+    print("Feed size: {:,} bytes\n".format(len(data)))
+    print("| Items | Parser | Time (ms) | Peak memory (KiB) |")
+    print("| -- | -- | -- | -- |")
+
+    for limit in (3, 15):
+
+        # Both parsers must return the same items.
+        assert full_parse(data, limit) == streaming_parse(data, limit)
+
+        for name, func in (("fromstring + findall", full_parse), ("iter_items", streaming_parse)):
+            elapsed, peak = measure(func, data, limit)
+            print("| {} | {} | {:.3f} | {:,.1f} |".format(limit, name, elapsed, peak))
+
+
+if __name__ == "__main__":
+
+    main()
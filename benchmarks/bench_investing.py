@@ -0,0 +1,117 @@
+"""
+Compares the restricted investing.com parse against building the full
+BeautifulSoup tree of the page.
+
+Saved investing.com pages can be passed as arguments, otherwise a page
+of a similar size is generated.
+
+python3 bench_investing.py [usd-mxn.html eur-mxn.html ...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "financebot"))
+
+import bot
+
+REPEATS = 10
+
+ROW_TEMPLATE = """<tr class="datatable_row"><td class="datatable_cell"><a href="/currencies/pair-{0}">
+<span class="text-sm">Par {0}</span></a></td><td class="datatable_cell">{0}.1234</td>
+<td class="datatable_cell"><span class="text-positive">+0.{0}%</span></td></tr>
+"""
+
+
+def make_page(rows=2500):
+    """Generates a page with the price spans surrounded by a large body."""
+
+    body = "".join(ROW_TEMPLATE.format(i) for i in range(rows))
+
+    return ("<!DOCTYPE html><html><head><title>USD/MXN</title>"
+            "<script>var data = {};</script></head><body><div id=\"__next\">"
+            "<div class=\"instrument-header\"><span data-test=\"instrument-price-last\">17.1234</span>"
+            "<span data-test=\"instrument-price-change-percent\">(+0.25%)</span></div>"
+            "<table>" + body + "</table></div></body></html>")
+
+
+def full_parse(html):
+    """The previous approach, builds the tree of the whole page."""
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    try:
+        latest_data = soup.find(
+            "div", {"class": "top bold inlineblock"}).text.strip().split()
+
+        price = latest_data[0]
+        percentage = latest_data[2]
+    except:
+        price = soup.find(
+            "span", {"data-test": "instrument-price-last"}).text.strip()
+
+        percentage = soup.find(
+            "span", {"data-test": "instrument-price-change-percent"}).text.strip()[1:-1]
+
+    return ("USD/MXN", price, percentage)
+
+
+def restricted_parse(html):
+    """The new approach, only parses the elements containing the values."""
+
+    return bot.parse_investing_data("USD/MXN", html)
+
+
+def measure(func, html):
+    """Returns the average CPU time in milliseconds and the peak memory in KiB."""
+
+    start = time.process_time()
+
+    for _ in range(REPEATS):
+        func(html)
+
+    elapsed = (time.process_time() - start) / REPEATS * 1000
+
+    tracemalloc.start()
+    func(html)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    pages = list()
+
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as temp_file:
+            pages.append((os.path.basename(path), temp_file.read()))
+
+    if not pages:
+        pages.append(("generated", make_page()))
+
+    print("| Page | Size (KiB) | Method | CPU time (ms) | Peak memory (KiB) |")
+    print("| -- | -- | -- | -- | -- |")
+
+    for name, html in pages:
+
+        # Both approaches must return the same values.
+        assert full_parse(html) == restricted_parse(html)
+
+        for method, func in (("full tree", full_parse), ("parse_investing_data", restricted_parse)):
+            elapsed, peak = measure(func, html)
+            print("| {} | {:,.1f} | {} | {:.1f} | {:,.1f} |".format(
+                name, len(html) / 1024, method, elapsed, peak))
+
+
+if __name__ == "__main__":
+
+    main()
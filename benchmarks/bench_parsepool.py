@@ -0,0 +1,113 @@
+"""
+Measures how the parse phase scales with the parse process pool.
+
+The recorded investing.com page is parsed once per instrument and the
+three Wikipedia pages once each, all at the same time from threads like
+the bots do, first in the calling threads and then with 1 to 4 worker
+processes. Record the fixtures first with python3 run.py --record.
+
+python3 bench_parsepool.py [--fixtures DIR]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import parsepool
+import run
+
+REPEATS = 3
+MAX_WORKERS = 4
+
+
+def get_tasks(bots, fixtures_dir):
+    """Lists the parse calls made by one run of financebot and coronabot.
+
+    Parameters
+    ----------
+    bots : dict
+        The bot modules by folder.
+
+    fixtures_dir : str
+        The folder of the fixture files.
+
+    Returns
+    -------
+    list
+        A list of (function, arguments).
+
+    """
+
+    def read(file_name):
+        with open(os.path.join(fixtures_dir, file_name), "r", encoding="utf-8") as temp_file:
+            return temp_file.read()
+
+    financebot = bots["financebot"]
+    coronabot = bots["coronabot"]
+
+    investing = read("investing.html")
+
+    tasks = [(financebot.parse_investing_data, (name, investing))
+             for name in financebot.INVESTING_DICT]
+
+    tasks.append((coronabot.parse_international_epidemiology,
+                  (read("wikipedia_international.html"),)))
+    tasks.append((coronabot.parse_national_epidemiology, (read("wikipedia_national.html"),)))
+    tasks.append((coronabot.parse_chronology, ((read("wikipedia_chronology.html"),),)))
+
+    return tasks
+
+
+def measure(tasks):
+    """Parses all the pages at the same time and returns the best wall time in seconds."""
+
+    best = None
+
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(parsepool.run, func, *args) for func, args in tasks]
+            [future.result() for future in futures]
+
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    parser = argparse.ArgumentParser(description="Benchmarks the parse process pool.")
+    parser.add_argument("--fixtures", default=run.FIXTURES_DIR, help="the fixtures folder")
+    args = parser.parse_args()
+
+    bots = run.load_bots()
+    tasks = get_tasks(bots, args.fixtures)
+
+    print("{} CPUs, {} pages\n".format(os.cpu_count(), len(tasks)))
+    print("| Workers | Wall time (ms) | Speedup |")
+    print("| -- | -- | -- |")
+
+    # The first run loads the lazy imports before any worker is forked.
+    baseline = measure(tasks)
+    print("| none (threads) | {:.0f} | 1.00x |".format(baseline * 1000))
+
+    for workers in range(1, MAX_WORKERS + 1):
+        parsepool.start(workers)
+        elapsed = measure(tasks)
+        parsepool.stop()
+
+        print("| {} | {:.0f} | {:.2f}x |".format(workers, elapsed * 1000, baseline / elapsed))
+
+
+if __name__ == "__main__":
+
+    main()
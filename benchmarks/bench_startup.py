@@ -0,0 +1,125 @@
+"""
+Measures the cold start of each bot.
+
+For each bot it reports the time it takes to import its module, the
+slowest imports according to `python3 -X importtime` and, with --api,
+the time from the interpreter start to the first Reddit API call.
+The --api option uses the credentials from config.py.
+
+python3 bench_startup.py [--api]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BOTS = ["autoposter", "financebot", "coronabot", "stickybot"]
+
+# How many of the slowest imports are reported.
+SLOWEST = 4
+
+FIRST_CALL_CODE = """
+import time
+start = time.perf_counter()
+import bot
+import redditclient
+redditclient.get_reddit().user.me()
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(folder, args):
+    """Runs the Python interpreter inside a bot folder.
+
+    Parameters
+    ----------
+    folder : str
+        The bot folder.
+
+    args : list
+        The interpreter arguments.
+
+    Returns
+    -------
+    tuple
+        The completed process and the wall time in seconds.
+
+    """
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+
+    process = subprocess.run([sys.executable] + args, cwd=os.path.join(ROOT, folder),
+                             env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True, check=True)
+
+    return process, time.perf_counter() - start
+
+
+def parse_importtime(output):
+    """Parses the output of -X importtime.
+
+    Parameters
+    ----------
+    output : str
+        The stderr of the interpreter.
+
+    Returns
+    -------
+    tuple
+        The cumulative microseconds of the bot import and a list of
+        (cumulative microseconds, module name) of the modules it imports.
+
+    """
+
+    children = list()
+
+    for line in output.splitlines():
+
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+
+        # Nested imports are printed before the module that imports them.
+        if level == 1:
+            children.append((int(cumulative), name.strip()))
+        elif level == 0:
+            if name.strip() == "bot":
+                return int(cumulative), sorted(children, reverse=True)
+
+            children = list()
+
+    return 0, []
+
+
+def main():
+    """Runs the benchmark and prints a table with the results."""
+
+    print("| Bot | Process (ms) | Import bot (ms) | Slowest imports (ms) | First API call (ms) |")
+    print("| -- | -- | -- | -- | -- |")
+
+    for folder in BOTS:
+
+        process, elapsed = run_python(folder, ["-X", "importtime", "-c", "import bot"])
+        bot_time, imports = parse_importtime(process.stderr)
+
+        slowest = ", ".join("{} {:.0f}".format(name, cumulative / 1000)
+                            for cumulative, name in imports[:SLOWEST])
+
+        first_call = ""
+
+        if "--api" in sys.argv:
+            process, _ = run_python(folder, ["-c", FIRST_CALL_CODE])
+            first_call = "{:.0f}".format(float(process.stdout) * 1000)
+
+        print("| {} | {:.0f} | {:.0f} | {} | {} |".format(
+            folder, elapsed * 1000, bot_time / 1000, slowest, first_call))
+
+
+if __name__ == "__main__":
+
+    main()
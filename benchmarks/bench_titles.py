@@ -0,0 +1,180 @@
+"""
+Measures the recent titles index of the autoposter.
+
+Loads a full titles file with and without the stored signatures, then
+for several band sizes counts how many indexed titles each lookup
+compares and how many near duplicates are found at each similarity.
+
+python3 bench_titles.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "autoposter"))
+
+import bot
+
+WORDS = """gobierno méxico presidente alcalde senado diputados congreso reforma
+elecciones partido morena pan pri candidato encuesta seguridad policía guardia
+nacional violencia homicidios detenidos cártel operativo marina ejército jalisco
+puebla monterrey guadalajara oaxaca chiapas sonora cdmx ecatepec tijuana sismo
+lluvias huracán inundaciones clima temperatura salud hospital vacuna contagios
+casos escuela maestros estudiantes universidad unam economía peso dólar inflación
+banxico tasa empleo salario gasolina pemex cfe energía tren maya aeropuerto obra
+inversión empresa trabajadores huelga protesta marcha mujeres feminicidio juez
+fiscalía investigación denuncia corrupción desfalco millones pesos programa apoyo
+becas adultos mayores familias víctimas rescate migrantes frontera estados unidos
+trump aranceles tratado comercio exportaciones futbol selección liga américa
+chivas tigres rayados pumas partido final campeón""".split()
+
+STOP_WORDS = ["de", "la", "el", "en", "y", "a", "los", "las", "por", "para", "con", "del",
+              "se", "su", "al", "tras", "sin", "sobre"]
+
+ENTRIES = 2000
+LOOKUPS = 500
+PAIRS = 400
+
+# The similarity ranges of the near duplicates.
+RANGES = [(0.3, 0.4), (0.4, 0.5), (0.5, 0.6), (0.6, 0.8), (0.8, 1.01)]
+
+
+def make_title(rng):
+    """Generates a random news title."""
+
+    words = list()
+
+    for _ in range(rng.randint(7, 14)):
+        words.append(rng.choice(STOP_WORDS) if rng.random() < 0.35 else rng.choice(WORDS))
+
+    return " ".join(words).capitalize()
+
+
+def make_near_duplicate(rng, title):
+    """Replaces, removes or adds a few words of a title, like another outlet would."""
+
+    words = title.split()
+
+    for _ in range(rng.randint(1, 5)):
+        choice = rng.random()
+
+        if choice < 0.5:
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+        elif choice < 0.75 and len(words) > 4:
+            words.pop(rng.randrange(len(words)))
+        else:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(WORDS + STOP_WORDS))
+
+    return " ".join(words)
+
+
+def similarity(first, second):
+    """The exact Jaccard similarity of the shingles of two titles."""
+
+    first = bot.get_shingles(first)
+    second = bot.get_shingles(second)
+
+    return len(first & second) / len(first | second)
+
+
+def measure_load(titles):
+    """Returns the milliseconds to load the titles without and with stored signatures."""
+
+    results = list()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bot.TITLES_FILE = os.path.join(temp_dir, "titles.log")
+        now = time.time()
+
+        # The format of the previous version, without signatures.
+        with open(bot.TITLES_FILE, "w", encoding="utf-8") as temp_file:
+            for i, title in enumerate(titles):
+                temp_file.write("{}\t{}\t{}\n".format(now - ENTRIES + i, "mexico", title))
+
+        for _ in range(2):
+            start = time.perf_counter()
+            bot.load_titles()
+            results.append((time.perf_counter() - start) * 1000)
+
+    return results
+
+
+def measure_rows(rows, titles, lookups, pairs):
+    """Returns the average compared titles per lookup and the recall per similarity range."""
+
+    index = bot.TitleIndex()
+    index.rows = rows
+
+    for title in titles:
+        index.add(title)
+
+    compared = 0
+
+    for title in lookups:
+        candidates = set()
+
+        for band in index.get_bands(bot.get_signature(bot.get_shingles(title))):
+            candidates.update(index.buckets.get(band, ()))
+
+        compared += len(candidates)
+
+    found = {value_range: [0, 0] for value_range in RANGES}
+
+    for original, duplicate, value in pairs:
+        duplicates = bot.TitleIndex()
+        duplicates.rows = rows
+        duplicates.add(original)
+
+        for value_range in RANGES:
+            if value_range[0] <= value < value_range[1]:
+                found[value_range][0] += duplicates.find(duplicate)[0] is not None
+                found[value_range][1] += 1
+
+    return compared / len(lookups), found
+
+
+def main():
+    """Runs the benchmark and prints tables with the results."""
+
+    rng = random.Random(0)
+
+    titles = [make_title(rng) for _ in range(ENTRIES)]
+    lookups = [make_title(rng) for _ in range(LOOKUPS)]
+
+    pairs = list()
+
+    for _ in range(PAIRS):
+        original = make_title(rng)
+        duplicate = make_near_duplicate(rng, original)
+        pairs.append((original, duplicate, similarity(original, duplicate)))
+
+    without_signatures, with_signatures = measure_load(titles)
+
+    print("Loading {:,} titles\n".format(ENTRIES))
+    print("| Signatures | Time (ms) |")
+    print("| -- | -- |")
+    print("| hashed | {:.1f} |".format(without_signatures))
+    print("| stored | {:.1f} |".format(with_signatures))
+
+    print("\nBands of {} hashes, {} is the default\n".format(
+        bot.NUM_HASHES, bot.get_band_rows(bot.SIMILARITY_THRESHOLD)))
+    print("| Rows | Compared per lookup | " + " | ".join(
+        "Recall {:.1f}-{:.1f}".format(low, min(high, 1)) for low, high in RANGES) + " |")
+    print("| -- " * (len(RANGES) + 2) + "|")
+
+    for rows in (2, 3, 4, 5):
+        compared, found = measure_rows(rows, titles, lookups, pairs)
+
+        print("| {} | {:.1f} | ".format(rows, compared) + " | ".join(
+            "{:.0%} ({})".format(hits / total if total else 0, total)
+            for hits, total in found.values()) + " |")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,639 @@
+"""
+Runs the real entry points of every bot against local stand-ins of
+Reddit and of the sources, to find out how many subreddits and feeds a
+single machine can serve.
+
+A fake Reddit API answers the OAuth, submit, sticky, edit, wiki and
+widget endpoints with rate limit headers, injected latency and optional
+random 429 responses. A second server replays the recorded fixtures of
+benchmarks/run.py (record them first with python3 run.py --record) and
+generates a new Google News feed on every request.
+
+Every simulated subreddit gets its own folder and runs the autoposter
+(with --feeds routes), financebot, coronabot and the Monday sticky and
+unsticky actions. It reports the job throughput, the duration of each
+job and the latency percentiles and 429 responses of the Reddit API.
+
+python3 load.py [--subreddits 4] [--feeds 2] [--rounds 2] [--processes 1]
+                [--latency 50] [--limit 600] [--window 600] [--error-rate 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from requests.adapters import HTTPAdapter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import config
+import httpclient
+import redditclient
+import run
+import scheduler
+
+WIDGET_ID = "widget_load_test"
+
+# The Reddit API paths and the name they are reported with.
+REDDIT_ENDPOINTS = [
+    (re.compile(r"^/api/v1/access_token"), "access_token"),
+    (re.compile(r"^/api/submit"), "submit"),
+    (re.compile(r"^/api/set_subreddit_sticky"), "sticky"),
+    (re.compile(r"^/api/editusertext"), "edit"),
+    (re.compile(r"^/r/[^/]+/api/wiki/edit"), "wiki_edit"),
+    (re.compile(r"^/r/[^/]+/api/widget/"), "widget_update"),
+    (re.compile(r"^/r/[^/]+/top"), "top")
+]
+
+
+class Stats:
+    """Thread safe record of the requests answered by a fake server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = dict()
+        self.statuses = dict()
+
+    def add(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies.setdefault(endpoint, list()).append(seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class RateWindow:
+    """Emulates the Reddit rate limit, a fixed number of requests per window.
+
+    Parameters
+    ----------
+    limit : int
+        The requests allowed per window.
+
+    window : int
+        The window length in seconds.
+
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.used = 0
+
+    def take(self):
+        """Counts a request.
+
+        Returns
+        -------
+        tuple
+            Whether the request is allowed and the used, remaining and reset headers.
+
+        """
+
+        with self.lock:
+            now = time.monotonic()
+
+            if now - self.start >= self.window:
+                self.start = now
+                self.used = 0
+
+            reset = max(1, int(self.window - (now - self.start)))
+            allowed = self.used < self.limit
+
+            if allowed:
+                self.used += 1
+
+            return allowed, {
+                "x-ratelimit-used": str(self.used),
+                "x-ratelimit-remaining": str(float(self.limit - self.used)),
+                "x-ratelimit-reset": str(reset)
+            }
+
+
+def percentile(values, fraction):
+    """Gets a percentile using the nearest rank.
+
+    Parameters
+    ----------
+    values : list
+        The values.
+
+    fraction : float
+        The percentile between 0 and 1.
+
+    Returns
+    -------
+    float
+        The percentile or 0 if there are no values.
+
+    """
+
+    if not values:
+        return 0
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def make_reddit_handler(options, stats, rate_window):
+    """Creates the request handler of the fake Reddit API.
+
+    Parameters
+    ----------
+    options : argparse.Namespace
+        The harness options.
+
+    stats : Stats
+        Where the requests are recorded.
+
+    rate_window : RateWindow
+        The shared rate limit.
+
+    Returns
+    -------
+    class
+        A BaseHTTPRequestHandler subclass.
+
+    """
+
+    counter = {"ids": 0}
+    counter_lock = threading.Lock()
+
+    def new_id():
+        with counter_lock:
+            counter["ids"] += 1
+            return "load{}".format(counter["ids"])
+
+    class RedditHandler(BaseHTTPRequestHandler):
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def answer(self, status, body, headers):
+            data = json.dumps(body).encode("utf-8")
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+
+            for k, v in headers.items():
+                self.send_header(k, v)
+
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_any(self):
+            start = time.perf_counter()
+            path = urlparse(self.path).path
+
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode("utf-8")) if length else dict()
+
+            endpoint = "other"
+
+            for pattern, name in REDDIT_ENDPOINTS:
+                if pattern.match(path):
+                    endpoint = name
+                    break
+
+            if options.latency:
+                time.sleep(max(0, random.gauss(options.latency, options.jitter)) / 1000)
+
+            if endpoint == "access_token":
+                status = 200
+                body = {"access_token": "load-test", "token_type": "bearer",
+                        "expires_in": 3600, "scope": "*"}
+                headers = dict()
+            else:
+                allowed, headers = rate_window.take()
+
+                if not allowed or random.random() < options.error_rate:
+                    status = 429
+                    body = {"message": "Too Many Requests", "error": 429}
+                    headers["retry-after"] = "1"
+                else:
+                    status = 200
+                    body = self.get_body(endpoint, path, form)
+
+            self.answer(status, body, headers)
+            stats.add(endpoint, status, time.perf_counter() - start)
+
+        def get_body(self, endpoint, path, form):
+
+            if endpoint == "submit":
+                post_id = new_id()
+                return {"json": {"errors": [], "data": {
+                    "url": "https://reddit.com/comments/{}".format(post_id),
+                    "id": post_id, "name": "t3_" + post_id}}}
+
+            if endpoint == "edit":
+                post_id = form.get("thing_id", ["t3_x"])[0].split("_", 1)[1]
+                return {"json": {"errors": [], "data": {"things": [
+                    {"kind": "t3", "data": {"id": post_id, "name": "t3_" + post_id,
+                                            "selftext": form.get("text", [""])[0]}}]}}}
+
+            if endpoint == "widget_update":
+                return {"kind": "textarea", "shortName": "Load test",
+                        "id": path.rsplit("/", 1)[1], "text": ""}
+
+            if endpoint == "top":
+                return {"kind": "Listing", "data": {"after": None, "before": None, "children": [
+                    {"kind": "t3", "data": {"id": new_id(), "title": "Top post {}".format(i)}}
+                    for i in range(3)]}}
+
+            return {"json": {"errors": []}}
+
+        do_GET = handle_any
+        do_POST = handle_any
+        do_PUT = handle_any
+
+    return RedditHandler
+
+
+def make_source_handler(options, stats, fixtures):
+    """Creates the request handler of the fake sources.
+
+    Parameters
+    ----------
+    options : argparse.Namespace
+        The harness options.
+
+    stats : Stats
+        Where the requests are recorded.
+
+    fixtures : list
+        A list of (url substring, content) pairs.
+
+    Returns
+    -------
+    class
+        A BaseHTTPRequestHandler subclass.
+
+    """
+
+    counter = {"feeds": 0}
+    counter_lock = threading.Lock()
+
+    def make_feed(url):
+        with counter_lock:
+            counter["feeds"] += 1
+            number = counter["feeds"]
+
+        # Every request gets new links and unrelated titles so the autoposter
+        # always has something to post.
+        query = parse_qs(urlparse(url).query).get("q", ["news"])[0].split()[0]
+        items = "".join(
+            "<item><title>Noticia {3:024x} - Medio</title>"
+            "<link>https://example.com/{0}/{1}/{2}</link>"
+            "<guid>{0}-{1}-{2}</guid></item>".format(
+                query, number, i, random.Random("{}-{}-{}".format(query, number, i)).getrandbits(96))
+            for i in range(20))
+
+        return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel>"
+                "<title>Google News</title>" + items + "</channel></rss>").encode("utf-8")
+
+    class SourceHandler(BaseHTTPRequestHandler):
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start = time.perf_counter()
+            url = parse_qs(urlparse(self.path).query)["url"][0]
+
+            if options.source_latency:
+                time.sleep(options.source_latency / 1000)
+
+            status = 200
+            content_type = "text/html; charset=utf-8"
+
+            if "/w/api.php" in url:
+                endpoint = "wikipedia_api"
+                content_type = "application/json"
+                data = json.dumps({"query": {"pages": [{
+                    "lastrevid": 1,
+                    "touched": "2020-04-01T00:00:00Z"
+                }]}}).encode("utf-8")
+            elif "news.google.com" in url:
+                endpoint = "news"
+                content_type = "application/rss+xml; charset=utf-8"
+                data = make_feed(url)
+            else:
+                endpoint = "missing"
+                status = 404
+                data = b""
+
+                for match, file_name, content in fixtures:
+                    if match in url:
+                        endpoint = file_name
+                        status = 200
+                        content_type = run.CONTENT_TYPES[os.path.splitext(file_name)[1]]
+                        data = content
+                        break
+
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+            stats.add(endpoint, status, time.perf_counter() - start)
+
+    return SourceHandler
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends every request of the shared session to the fake sources server.
+
+    Parameters
+    ----------
+    base_url : str
+        The url of the fake sources server.
+
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + "/?" + urlencode({"url": request.url})
+        return super().send(request, **kwargs)
+
+
+def start_server(handler):
+    """Starts a server in a background thread.
+
+    Parameters
+    ----------
+    handler : class
+        The request handler.
+
+    Returns
+    -------
+    tuple
+        The server and its url.
+
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+def prepare_folder(work_dir, index):
+    """Creates the folders of a simulated subreddit.
+
+    Parameters
+    ----------
+    work_dir : str
+        The temporary folder of the harness.
+
+    index : int
+        The subreddit number.
+
+    Returns
+    -------
+    str
+        The subreddit folder.
+
+    """
+
+    folder = os.path.join(work_dir, "sub{}".format(index))
+
+    for bot in ("autoposter", "financebot", "coronabot", "stickybot"):
+        os.makedirs(os.path.join(folder, bot))
+
+    shutil.copy(os.path.join(ROOT, "financebot", "sidebar.txt"), os.path.join(folder, "financebot"))
+    shutil.copy(os.path.join(ROOT, "coronabot", "template.txt"), os.path.join(folder, "coronabot"))
+    shutil.copy(os.path.join(ROOT, "stickybot", "politicians.txt"), os.path.join(folder, "stickybot"))
+    shutil.copytree(os.path.join(ROOT, "stickybot", "templates"),
+                    os.path.join(folder, "stickybot", "templates"))
+
+    # The widget id is known in advance so the sidebar isn't scanned.
+    with open(os.path.join(folder, "financebot", "widget.json"), "w", encoding="utf-8") as temp_file:
+        json.dump({"id": WIDGET_ID, "kind": "textarea", "shortName": "Load test"}, temp_file)
+
+    return folder
+
+
+def run_subreddits(task):
+    """Runs every job of some simulated subreddits, called in the worker processes.
+
+    Parameters
+    ----------
+    task : tuple
+        The harness options, the urls of the fake servers, the
+        temporary folder and the subreddit numbers.
+
+    Returns
+    -------
+    list
+        A list of (bot, seconds, error) for every job.
+
+    """
+
+    options, reddit_url, source_url, work_dir, indexes = task
+
+    # The fake API accepts any credentials but PRAW needs them to be set.
+    for name in ("APP_ID", "APP_SECRET", "USER_AGENT", "REDDIT_USERNAME", "REDDIT_PASSWORD"):
+        setattr(config, name, getattr(config, name) or "load_test")
+
+    # Each process has its own Reddit session and token file.
+    redditclient.reddit = None
+    redditclient.OPTIONS = {"oauth_url": reddit_url, "reddit_url": reddit_url}
+    redditclient.TOKEN_FILE = os.path.join(work_dir, "token_{}.json".format(os.getpid()))
+
+    adapter = RedirectAdapter(source_url)
+    httpclient.session.mount("https://", adapter)
+    httpclient.session.mount("http://", adapter)
+
+    bots = {folder: scheduler.load_bot(folder)
+            for folder in ("autoposter", "financebot", "coronabot", "stickybot")}
+
+    bots["financebot"].WIDGET_NAME = "Load test"
+
+    results = list()
+
+    for _ in range(options.rounds):
+
+        for index in indexes:
+            subreddit = "sub{}".format(index)
+            folder = os.path.join(work_dir, subreddit)
+
+            config.SUBREDDIT = subreddit
+            bots["autoposter"].ROUTES = [("sub{}feed{}".format(index, i), subreddit, 3)
+                                         for i in range(options.feeds)]
+
+            jobs = [
+                ("autoposter", bots["autoposter"].init_bot, []),
+                ("financebot", bots["financebot"].init_bot, []),
+                ("coronabot", bots["coronabot"].main, []),
+                ("stickybot sticky", bots["stickybot"].run_action, ["sticky", "monday"]),
+                ("stickybot unsticky", bots["stickybot"].run_action, ["unsticky", "monday"])
+            ]
+
+            for name, func, args in jobs:
+                os.chdir(os.path.join(folder, name.split()[0]))
+                start = time.perf_counter()
+                error = None
+
+                try:
+                    func(*args)
+                except Exception:
+                    error = traceback.format_exc(limit=1).strip().splitlines()[-1]
+
+                results.append((name, time.perf_counter() - start, error))
+
+    os.chdir(ROOT)
+
+    return results
+
+
+def print_report(results, elapsed, reddit_stats, source_stats):
+    """Prints the results as Markdown tables.
+
+    Parameters
+    ----------
+    results : list
+        A list of (bot, seconds, error) for every job.
+
+    elapsed : float
+        The wall time of the whole run.
+
+    reddit_stats : Stats
+        The requests of the fake Reddit API.
+
+    source_stats : Stats
+        The requests of the fake sources.
+
+    """
+
+    failed = [result for result in results if result[2]]
+
+    print("Ran {} jobs in {:.1f}s, {:.2f} jobs/s, {} failed.\n".format(
+        len(results), elapsed, len(results) / elapsed, len(failed)))
+
+    print("| Job | Runs | p50 (ms) | p95 (ms) | Max (ms) | Failed |")
+    print("| -- | -- | -- | -- | -- | -- |")
+
+    for name in sorted({result[0] for result in results}):
+        durations = [result[1] * 1000 for result in results if result[0] == name]
+        errors = len([result for result in failed if result[0] == name])
+
+        print("| {} | {} | {:.0f} | {:.0f} | {:.0f} | {} |".format(
+            name, len(durations), percentile(durations, 0.5), percentile(durations, 0.95),
+            max(durations), errors))
+
+    for title, stats in (("Reddit endpoint", reddit_stats), ("Source", source_stats)):
+        print("\n| {} | Requests | Requests/s | p50 (ms) | p95 (ms) | p99 (ms) |".format(title))
+        print("| -- | -- | -- | -- | -- | -- |")
+
+        for endpoint, latencies in sorted(stats.latencies.items()):
+            latencies = [latency * 1000 for latency in latencies]
+
+            print("| {} | {} | {:.2f} | {:.1f} | {:.1f} | {:.1f} |".format(
+                endpoint, len(latencies), len(latencies) / elapsed, percentile(latencies, 0.5),
+                percentile(latencies, 0.95), percentile(latencies, 0.99)))
+
+    print("\nReddit responses by status: {}".format(
+        ", ".join("{} x{}".format(k, v) for k, v in sorted(reddit_stats.statuses.items()))))
+    print("429 responses: {}".format(reddit_stats.statuses.get(429, 0)))
+
+    for error in sorted({result[2] for result in failed}):
+        print("Error: {}".format(error))
+
+
+def main():
+    """Starts the fake servers, runs the jobs and prints the report."""
+
+    parser = argparse.ArgumentParser(description="Load tests the bots against local fake servers.")
+    parser.add_argument("--subreddits", type=int, default=4, help="simulated subreddits")
+    parser.add_argument("--feeds", type=int, default=2, help="autoposter routes per subreddit")
+    parser.add_argument("--rounds", type=int, default=2, help="times every job runs")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes")
+    parser.add_argument("--latency", type=float, default=50, help="Reddit latency in ms")
+    parser.add_argument("--jitter", type=float, default=10, help="Reddit latency deviation in ms")
+    parser.add_argument("--source-latency", type=float, default=20, help="sources latency in ms")
+    parser.add_argument("--limit", type=int, default=600, help="Reddit requests per window")
+    parser.add_argument("--window", type=int, default=600, help="Reddit rate limit window in seconds")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="fraction of Reddit requests answered with a 429")
+    parser.add_argument("--fixtures", default=run.FIXTURES_DIR, help="the fixtures folder")
+    options = parser.parse_args()
+
+    # The fixtures are matched by the urls of the bots.
+    bots = run.load_bots()
+    fixtures = list()
+
+    for file_name, match, _ in run.get_fixtures(bots):
+        try:
+            with open(os.path.join(options.fixtures, file_name), "rb") as temp_file:
+                fixtures.append((match, file_name, temp_file.read()))
+        except FileNotFoundError:
+            sys.exit("Missing fixture {}. Run python3 run.py --record first.".format(file_name))
+
+    reddit_stats = Stats()
+    source_stats = Stats()
+
+    reddit_server, reddit_url = start_server(
+        make_reddit_handler(options, reddit_stats, RateWindow(options.limit, options.window)))
+    source_server, source_url = start_server(
+        make_source_handler(options, source_stats, fixtures))
+
+    work_dir = tempfile.mkdtemp(prefix="bots_load_")
+
+    try:
+        indexes = list(range(options.subreddits))
+
+        for index in indexes:
+            prepare_folder(work_dir, index)
+
+        # The subreddits are split between the processes.
+        tasks = [(options, reddit_url, source_url, work_dir, indexes[i::options.processes])
+                 for i in range(options.processes)]
+
+        start = time.perf_counter()
+
+        if options.processes == 1:
+            results = run_subreddits(tasks[0])
+        else:
+            # Forked workers inherit the loaded modules, the servers keep running here.
+            with multiprocessing.get_context("fork").Pool(options.processes) as pool:
+                results = [result for task_results in pool.map(run_subreddits, tasks)
+                           for result in task_results]
+
+        elapsed = time.perf_counter() - start
+
+    finally:
+        reddit_server.shutdown()
+        source_server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(results, elapsed, reddit_stats, source_stats)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,414 @@
+"""
+Runs the scrapers and parsers of every bot against recorded fixtures.
+
+The HTML, XML and XLSX fixtures are served to the bots through the
+shared HTTP session, this way the real functions run without touching
+the network. For each function it reports the median wall and CPU time
+and the peak memory, compares them against the saved baseline and
+flags the ones that got slower or bigger than the threshold.
+
+Record the fixtures once (this is the only mode that uses the network):
+
+python3 run.py --record
+
+Save a baseline and compare later runs against it:
+
+python3 run.py --save
+python3 run.py [--threshold 0.2] [--fixtures DIR]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from urllib3 import HTTPResponse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import httpclient
+import scheduler
+
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+REPEATS = 10
+
+# Changes smaller than this are ignored, they are usually noise.
+MIN_TIME_DELTA = 0.001
+MIN_MEMORY_DELTA = 64 * 1024
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".xml": "application/rss+xml; charset=utf-8",
+    ".xlsx": "application/vnd.ms-excel"
+}
+
+
+def banxico_url(template, days):
+    """Formats a Banxico url the same way get_cetes() does.
+
+    Parameters
+    ----------
+    template : str
+        BANXICO1_URL or BANXICO2_URL.
+
+    days : int
+        How many days the file covers.
+
+    Returns
+    -------
+    str
+        The url of the Excel file.
+
+    """
+
+    now = datetime.now()
+    start = now - timedelta(days=days)
+
+    return template.format(int(start.timestamp()) * 1000, int(now.timestamp()) * 1000)
+
+
+def get_fixtures(bots):
+    """Lists the fixtures, the text that identifies their urls and where they are recorded from.
+
+    Parameters
+    ----------
+    bots : dict
+        The bot modules by folder.
+
+    Returns
+    -------
+    list
+        A list of (file name, url substring, record url), the first
+        matching substring is used.
+
+    """
+
+    financebot = bots["financebot"]
+    coronabot = bots["coronabot"]
+    autoposter = bots["autoposter"]
+
+    return [
+        ("investing.html", "investing.com/", list(financebot.INVESTING_DICT.values())[0]),
+        ("banxico_cf107.xlsx", "idCuadro=CF107", banxico_url(financebot.BANXICO1_URL, 21)),
+        ("banxico_cf114.xlsx", "idCuadro=CF114", banxico_url(financebot.BANXICO2_URL, 120)),
+        ("wikipedia_international.html", coronabot.INTERNATIONAL_URL, coronabot.INTERNATIONAL_URL),
+        ("wikipedia_national.html", coronabot.NATIONAL_URL, coronabot.NATIONAL_URL),
+        ("wikipedia_chronology.html", coronabot.CHRONOLOGY_URL, coronabot.CHRONOLOGY_URL),
+        ("news_coronabot.xml", coronabot.NEWS_URL, coronabot.NEWS_URL),
+        ("news_autoposter.xml", "news.google.com/",
+         autoposter.NEWS_URL.format(autoposter.ROUTES[0][0]))
+    ]
+
+
+class FixtureAdapter(BaseAdapter):
+    """Answers every request with the matching fixture.
+
+    Parameters
+    ----------
+    fixtures : list
+        The value returned by get_fixtures().
+
+    fixtures_dir : str
+        The folder of the fixture files.
+
+    """
+
+    def __init__(self, fixtures, fixtures_dir):
+        super().__init__()
+        self.contents = list()
+
+        for file_name, match, _ in fixtures:
+            with open(os.path.join(fixtures_dir, file_name), "rb") as temp_file:
+                self.contents.append((match, file_name, temp_file.read()))
+
+    def send(self, request, **kwargs):
+
+        for match, file_name, content in self.contents:
+            if match in request.url:
+                break
+        else:
+            raise ValueError("There is no fixture for {}".format(request.url))
+
+        content_type = CONTENT_TYPES[os.path.splitext(file_name)[1]]
+
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+        response.encoding = "utf-8" if "charset" in content_type else None
+        response.raw = HTTPResponse(body=BytesIO(content), status=200, preload_content=False,
+                                    headers={"Content-Type": content_type})
+
+        return response
+
+    def close(self):
+        pass
+
+
+def get_cases(bots, fixtures_dir):
+    """Lists the functions to measure.
+
+    Parameters
+    ----------
+    bots : dict
+        The bot modules by folder.
+
+    fixtures_dir : str
+        The folder of the fixture files.
+
+    Returns
+    -------
+    list
+        A list of (name, function) pairs.
+
+    """
+
+    financebot = bots["financebot"]
+    coronabot = bots["coronabot"]
+    autoposter = bots["autoposter"]
+
+    investing_name, investing_url = list(financebot.INVESTING_DICT.items())[0]
+    feed_url = autoposter.NEWS_URL.format(autoposter.ROUTES[0][0])
+
+    # find_value() is measured over every row of a recorded workbook.
+    from openpyxl import load_workbook
+
+    book = load_workbook(os.path.join(fixtures_dir, "banxico_cf114.xlsx"),
+                         read_only=True, data_only=True)
+
+    rows = list(book.worksheets[0].iter_rows(min_col=2, max_col=5, values_only=True))
+
+    def get_investing_data():
+        # A fresh bucket so the rate limit doesn't add sleeps to the timings.
+        financebot.BUCKETS.clear()
+        return financebot.get_investing_data(investing_name, investing_url)
+
+    def get_cetes():
+        # Without stored values both workbooks are downloaded and read.
+        shutil.rmtree(financebot.SERIES_DIR, ignore_errors=True)
+        return financebot.get_cetes()
+
+    def find_values():
+        return [financebot.find_value(row) for row in rows]
+
+    return [
+        ("financebot.get_investing_data", get_investing_data),
+        ("financebot.get_cetes", get_cetes),
+        ("financebot.get_cetes (stored)", financebot.get_cetes),
+        ("financebot.find_value", find_values),
+        ("coronabot.get_international_data", coronabot.get_international_data),
+        ("coronabot.get_national_data", coronabot.get_national_data),
+        ("coronabot.get_chronology_data", coronabot.get_chronology_data),
+        ("coronabot.get_news_data", coronabot.get_news_data),
+        ("autoposter.fetch_feed", lambda: autoposter.fetch_feed(feed_url, 50, dict()))
+    ]
+
+
+def measure(func):
+    """Measures a function.
+
+    Parameters
+    ----------
+    func : function
+        The function to measure.
+
+    Returns
+    -------
+    dict
+        The median wall and CPU seconds and the peak memory in bytes.
+
+    """
+
+    # The first call loads the lazy imports.
+    func()
+
+    wall_times = list()
+    cpu_times = list()
+
+    for _ in range(REPEATS):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        func()
+
+        cpu_times.append(time.process_time() - cpu_start)
+        wall_times.append(time.perf_counter() - wall_start)
+
+    # The memory is measured separately since tracemalloc slows everything down.
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"wall": statistics.median(wall_times), "cpu": statistics.median(cpu_times),
+            "peak": peak}
+
+
+def find_regressions(result, baseline, threshold):
+    """Compares a result against its baseline.
+
+    Parameters
+    ----------
+    result : dict
+        The value returned by measure().
+
+    baseline : dict
+        The saved result or None.
+
+    threshold : float
+        The allowed relative increase.
+
+    Returns
+    -------
+    list
+        The names of the values that regressed.
+
+    """
+
+    if not baseline:
+        return list()
+
+    regressions = list()
+
+    for key, min_delta in (("wall", MIN_TIME_DELTA), ("cpu", MIN_TIME_DELTA),
+                           ("peak", MIN_MEMORY_DELTA)):
+
+        delta = result[key] - baseline[key]
+
+        if delta > min_delta and delta > baseline[key] * threshold:
+            regressions.append(key)
+
+    return regressions
+
+
+def load_bots():
+    """Loads every bot that has benchmarks under a unique module name.
+
+    Returns
+    -------
+    dict
+        The bot modules by folder.
+
+    """
+
+    bots = {folder: scheduler.load_bot(folder)
+            for folder in ("financebot", "coronabot", "autoposter")}
+
+    os.chdir(ROOT)
+
+    return bots
+
+
+def record(bots, fixtures_dir):
+    """Downloads the fixtures.
+
+    Parameters
+    ----------
+    bots : dict
+        The bot modules by folder.
+
+    fixtures_dir : str
+        The folder of the fixture files.
+
+    """
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+
+    for file_name, _, url in get_fixtures(bots):
+
+        with httpclient.get(url) as response:
+            response.raise_for_status()
+
+            with open(os.path.join(fixtures_dir, file_name), "wb") as temp_file:
+                temp_file.write(response.content)
+
+        print("Recorded {} ({:,} bytes)".format(file_name, len(response.content)))
+
+
+def main():
+    """Runs the benchmarks and prints a table with the results."""
+
+    parser = argparse.ArgumentParser(description="Benchmarks the bots against recorded fixtures.")
+    parser.add_argument("--record", action="store_true", help="download the fixtures")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative increase reported as a regression (default 0.2)")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="the fixtures folder")
+    args = parser.parse_args()
+
+    bots = load_bots()
+
+    if args.record:
+        record(bots, args.fixtures)
+        return
+
+    fixtures = get_fixtures(bots)
+    missing = [file_name for file_name, _, _ in fixtures
+               if not os.path.exists(os.path.join(args.fixtures, file_name))]
+
+    if missing:
+        sys.exit("Missing fixtures: {}. Run python3 run.py --record first.".format(", ".join(missing)))
+
+    adapter = FixtureAdapter(fixtures, args.fixtures)
+    httpclient.session.mount("https://", adapter)
+    httpclient.session.mount("http://", adapter)
+
+    try:
+        with open(BASELINE_FILE, "r", encoding="utf-8") as temp_file:
+            baselines = json.load(temp_file)
+    except FileNotFoundError:
+        baselines = dict()
+
+    results = dict()
+    regressed = list()
+
+    print("| Function | Wall (ms) | CPU (ms) | Peak memory (KiB) | Regressions |")
+    print("| -- | -- | -- | -- | -- |")
+
+    # Files written by the bots (feeds.json) go to a temporary folder.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+
+        for name, func in get_cases(bots, args.fixtures):
+            result = measure(func)
+            results[name] = result
+
+            regressions = find_regressions(result, baselines.get(name), args.threshold)
+
+            if regressions:
+                regressed.append(name)
+
+            print("| {} | {:.2f} | {:.2f} | {:,.0f} | {} |".format(
+                name, result["wall"] * 1000, result["cpu"] * 1000, result["peak"] / 1024,
+                ", ".join(regressions) if regressions else "-" if name in baselines else "no baseline"))
+
+        os.chdir(ROOT)
+
+    if args.save:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as temp_file:
+            json.dump(results, temp_file, indent=4, sort_keys=True)
+
+        print("\nBaseline saved to {}".format(BASELINE_FILE))
+
+    if regressed:
+        sys.exit("\n{} functions regressed more than {:.0%}.".format(len(regressed), args.threshold))
+
+
+if __name__ == "__main__":
+
+    main()
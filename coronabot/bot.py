@@ -3,47 +3,386 @@ This script consumes data from Wikipedia and a Google RSS feed.
 Then it fills a template with that data and updates a Reddit submission.
 """
 
-import xml.etree.ElementTree as ET
+import codecs
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import unquote
 
-import praw
 import requests
-from bs4 import BeautifulSoup
 
-import config
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:73.0) Gecko/20100101 Firefox/73.0"}
+import feeds
+import httpclient
+import metrics
+import parsepool
+import redditclient
+import writegate
+import writequeue
+
+SUBMISSION_ID = "hl4nl0"
+SECTIONS_FILE = "./sections.json"
+TEMPLATE_FILE = "./template.txt"
+
+CHRONOLOGY_URL = "https://es.wikipedia.org/wiki/Pandemia_de_enfermedad_por_coronavirus_de_2020_en_M%C3%A9xico"
+INTERNATIONAL_URL = "https://en.wikipedia.org/wiki/Template:2019%E2%80%9320_coronavirus_pandemic_data"
+NATIONAL_URL = "https://en.wikipedia.org/wiki/COVID-19_pandemic_in_Mexico"
+NEWS_URL = "https://news.google.com/rss/search?q=méxico+covid-19+when:1d&hl=es-419&gl=MX"
+
+# The Wikipedia page of each section, their revision is checked before
+# downloading them again.
+WIKIPEDIA_SECTIONS = {
+    "international": INTERNATIONAL_URL,
+    "national": NATIONAL_URL,
+    "chronology": CHRONOLOGY_URL
+}
+
+# Unchanged data is published again after this many seconds.
+MAX_UNCHANGED_AGE = 60 * 60 * 6
+
+# This dict contains the requested countries by the community.
+COUNTRIES = {
+    "Mexico": "México",
+    "United States": "EE. UU.",
+    "Pakistan": "Pakistán",
+    "Italy": "Italia",
+    "Japan": "Japón",
+    "China": "China",
+    "Finland": "Finlandia",
+    "Turkey": "Turquía",
+    "Spain": "España",
+    "Russia": "Rusia",
+    "Iran": "Irán",
+    "South Africa": "Sudáfrica",
+    "Peru": "Perú",
+    "South Korea": "Corea del Sur",
+    "Brazil": "Brasil",
+    "Ecuador": "Ecuador",
+    "Argentina": "Argentina",
+    "Chile": "Chile",
+    "Netherlands": "Países Bajos",
+    "Sweden": "Suecia",
+    "Norway": "Noruega",
+    "Philippines": "Filipinas",
+    "France": "Francia",
+    "Germany": "Alemania",
+    "United Kingdom": "Reino Unido",
+    "Switzerland": "Suiza",
+    "India": "India",
+    "Colombia": "Colombia"
+}
+
+# Other names used by Wikipedia for the same countries.
+COUNTRY_ALIASES = {
+    "China (mainland)": "China",
+    "Mainland China": "China",
+    "United States of America": "United States",
+    "Turkiye": "Turkey",
+    "Türkiye": "Turkey",
+    "Korea, South": "South Korea",
+    "Republic of Korea": "South Korea",
+    "Iran, Islamic Republic of": "Iran",
+    "Russian Federation": "Russia"
+}
+
+# Lowercase names of the countries and their aliases, see normalize_country().
+COUNTRY_INDEX = {k.lower(): v for k, v in COUNTRIES.items()}
+COUNTRY_INDEX.update({k.lower(): COUNTRIES[v] for k, v in COUNTRY_ALIASES.items()})
+
+# How many cells of each row are checked for the country name.
+COUNTRY_CELLS = 3
+
+# The chronology starts at the element with this id and it's downloaded in chunks of this size.
+CHRONOLOGY_ID = "Cronología"
+CHUNK_SIZE = 16 * 1024
+
+# The contents of these tags and classes are not part of the chronology text.
+CHRONOLOGY_SKIP_TAGS = {"sup", "table", "figure", "style", "script"}
+CHRONOLOGY_SKIP_CLASSES = {"mw-editsection", "thumb", "navbox", "reflist", "gallery"}
+
+# Tags without a closing tag.
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "source", "track", "wbr"}
+
+# The template split on its placeholders and its modification time, see compile_template().
+template_cache = dict()
 
 
 def main():
     """Starts getting the data."""
 
-    chronology = get_chronology()
-    links = get_latest_news()
-    international_table = get_international_epidemiology()
-    national_table = get_national_epidemiology()
+    # Each section has a function that extracts its data and another one that
+    # renders it, in the same order as the template placeholders.
+    extractors = {
+        "international": (get_international_data, render_international),
+        "national": (get_national_data, render_national),
+        "chronology": (get_chronology_data, render_chronology),
+        "news": (get_news_data, render_news)
+    }
+
+    sections = load_sections()
+
+    # The parse workers are forked before any thread is started.
+    parsepool.start()
+
+    # All the sources are requested at the same time.
+    with ThreadPoolExecutor(max_workers=len(extractors)) as executor:
+        futures = {k: executor.submit(get_section, k, v[0], v[1], sections.get(k))
+                   for k, v in extractors.items()}
+
+    for k, future in futures.items():
+
+        try:
+            sections[k] = future.result()
+        except Exception as error:
+
+            # A failed section keeps its last good version.
+            if k not in sections:
+                raise
+
+            print("Failed to get the {} section, using the last good version:".format(k), error)
+
+    save_sections(sections)
 
     # Prepare the footer with the current date and time.
     footer = "\nÚltima actualización: {:%d-%m-%Y a las %H:%M:%S}".format(
         datetime.now())
 
-    template = open("./template.txt", "r", encoding="utf-8").read()
+    template = compile_template()
+    values = [sections[k]["text"] for k in extractors]
+
+    submission_text = fill_template(template, values + [footer])
+
+    # The footer is left out, we only edit the submission if the data changed.
+    data = "".join(template + values)
+    target = "submission/{}".format(SUBMISSION_ID)
+
+    if not writegate.has_changed(target, data, MAX_UNCHANGED_AGE):
+        print("No changes, skipping the edit.")
+        return
+
+    # We get the shared Reddit instance.
+    reddit = redditclient.get_reddit()
+
+    writequeue.enqueue(target, "edit", submission_id=SUBMISSION_ID, text=submission_text)
+    results, errors = writequeue.flush(reddit)
+
+    if target in errors:
+        raise errors[target]
+
+    if target in results:
+        writegate.mark_published(target, data)
+
+
+def compile_template():
+    """Splits the template on its placeholders, it's only read again when the file changes.
+
+    Returns
+    -------
+    list
+        The text between the placeholders.
+
+    """
+
+    modified = os.path.getmtime(TEMPLATE_FILE)
+
+    if template_cache.get("modified") != modified:
+        with open(TEMPLATE_FILE, "r", encoding="utf-8") as temp_file:
+            template_cache["parts"] = temp_file.read().split("{}")
+
+        template_cache["modified"] = modified
+
+    return template_cache["parts"]
+
+
+def fill_template(template, values):
+    """Fills the template placeholders.
+
+    Parameters
+    ----------
+    template : list
+        The value returned by compile_template().
+
+    values : list
+        The text of each placeholder.
+
+    Returns
+    -------
+    str
+        The filled template.
+
+    """
+
+    if len(values) != len(template) - 1:
+        raise ValueError("The template has {} placeholders but {} values were given.".format(
+            len(template) - 1, len(values)))
+
+    parts = [template[0]]
+
+    for value, text in zip(values, template[1:]):
+        parts.append(value)
+        parts.append(text)
+
+    return "".join(parts)
+
+
+def load_sections():
+    """Loads the last good version of each section.
+
+    Returns
+    -------
+    dict
+        A dict of section names and their Markdown text, page revision
+        and data fingerprint.
+
+    """
+
+    try:
+        with open(SECTIONS_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def save_sections(sections):
+    """Saves the last good version of each section.
+
+    Parameters
+    ----------
+    sections : dict
+        A dict of section names and their Markdown text, page revision
+        and data fingerprint.
+
+    """
+
+    temp_name = SECTIONS_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(sections, temp_file, ensure_ascii=False)
+
+    os.replace(temp_name, SECTIONS_FILE)
+
+
+def get_section(name, extract, render, cached):
+    """Gets a section, reusing the cached one if its source didn't change.
+
+    Wikipedia sections are not downloaded when their page (or any of its
+    templates) didn't change. Otherwise the data is extracted and the section is only
+    rendered again when the fingerprint of its data changed.
+
+    Parameters
+    ----------
+    name : str
+        The section name.
+
+    extract : function
+        The function that downloads the section data.
+
+    render : function
+        The function that renders the section data as Markdown.
+
+    cached : dict
+        The last good version of the section or None.
+
+    Returns
+    -------
+    dict
+        A dict with the Markdown text, the page revision and the data fingerprint.
+
+    """
+
+    revision = None
+
+    if name in WIKIPEDIA_SECTIONS:
+        try:
+            revision = get_revision(WIKIPEDIA_SECTIONS[name])
+        except (requests.RequestException, ValueError, KeyError, IndexError) as error:
+            print("Failed to check the {} revision:".format(name), error)
+
+        if revision is not None and cached and cached.get("revision") == revision:
+            metrics.count("section_reused", section=name, reason="revision")
+            return cached
+
+    with metrics.timer("extract", section=name):
+        data = extract()
+
+    fingerprint = writegate.fingerprint(json.dumps(data, ensure_ascii=False))
+
+    if cached and cached.get("fingerprint") == fingerprint:
+        metrics.count("section_reused", section=name, reason="fingerprint")
+        return dict(cached, revision=revision)
+
+    with metrics.timer("render", section=name):
+        return {"text": render(data), "revision": revision, "fingerprint": fingerprint}
+
+
+def get_revision(url):
+    """Gets the version of a Wikipedia page, including the templates it uses.
+
+    The revision id alone doesn't change when a transcluded template is
+    edited, the epidemiology tables live in templates. The touched
+    timestamp changes when the page is rendered again for any reason.
+
+    Parameters
+    ----------
+    url : str
+        The Wikipedia page url.
+
+    Returns
+    -------
+    str
+        The latest revision id and the touched timestamp.
+
+    """
 
-    submission_text = template.format(
-        international_table, national_table, links, footer)
+    host, title = url.split("/wiki/", 1)
 
-    # We create the Reddit instance.
-    reddit = praw.Reddit(client_id=config.APP_ID, client_secret=config.APP_SECRET,
-                         user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
-                         password=config.REDDIT_PASSWORD)
+    params = {
+        "action": "query",
+        "prop": "info",
+        "titles": unquote(title),
+        "format": "json",
+        "formatversion": 2
+    }
+
+    with httpclient.get(host + "/w/api.php", params=params) as response:
+        response.raise_for_status()
+        page = response.json()["query"]["pages"][0]
 
-    reddit.submission("hl4nl0").edit(submission_text)
+    return "{}/{}".format(page["lastrevid"], page["touched"])
 
 
-def get_latest_news():
+def get_news_data():
     """Reads a RSS feed and extracts the latest 15 news headlines and links.
 
+    Returns
+    -------
+    list
+        A list of [title, url] pairs.
+
+    """
+
+    state = feeds.load_state()
+
+    # Only read the first 15 links, the saved ones are reused if the feed didn't change.
+    links = [[item.title.strip(), item.link]
+             for item in feeds.read_feed(NEWS_URL, 15, state, only_new=False)]
+
+    feeds.save_state(state)
+
+    return links
+
+
+def render_news(links):
+    """Renders the news links.
+
+    Parameters
+    ----------
+    links : list
+        The value returned by get_news_data().
+
     Returns
     -------
     str
@@ -51,25 +390,198 @@ def get_latest_news():
 
     """
 
-    url = "https://news.google.com/rss/search?q=méxico+covid-19+when:1d&hl=es-419&gl=MX"
-    links_string = ""
+    return "".join("* [{}]({})\n".format(title, url) for title, url in links)
+
+
+def get_chronology_data():
+    """Gets the chronology for the specified url.
+
+    The page is parsed while it's downloaded and the download stops
+    at the end of the chronology section.
 
-    with requests.get(url, headers=HEADERS) as response:
+    Returns
+    -------
+    list
+        A list of [tag name, text] pairs, the tag name is h3 for the
+        headings of each day and p for the paragraphs.
 
-        root = ET.fromstring(response.text)
+    """
 
-        # Only read the first 15 links.
-        for item in root.findall(".//item")[:15]:
+    with httpclient.get(CHRONOLOGY_URL, stream=True) as response:
+        response.raise_for_status()
 
-            title = item.find("title").text.strip()
-            url = item.find("link").text
-            links_string += "* [{}]({})\n".format(title, url)
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
 
-    return links_string
+        return parse_chronology(
+            decoder.decode(chunk) for chunk in response.iter_content(CHUNK_SIZE))
 
 
-def get_chronology():
-    """Gets the chronology for the specified url.
+class ChronologyParser(HTMLParser):
+    """Extracts the headings, paragraphs and list items of the chronology section.
+
+    Everything before the element with the Cronología id is ignored,
+    the parser is done at the next h2 heading. Only the h3 and p elements
+    that are siblings of the section heading and the items of sibling
+    lists are kept, like the ones inside galleries or captions are not.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.entries = list()
+        self.started = False
+        self.done = False
+
+        # The (tag, classes) of the open elements and the depth of the
+        # elements at the top of the section.
+        self.stack = list()
+        self.level = None
+
+        # The depth of the element being skipped and of the one being captured.
+        self.skip_depth = None
+        self.capture_depth = None
+        self.text = list()
+
+    def handle_starttag(self, tag, attrs):
+
+        if self.done or tag in VOID_TAGS:
+            return
+
+        if self.started and tag == "h2":
+            self.done = True
+            return
+
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+
+        depth = len(self.stack)
+        self.stack.append((tag, classes))
+
+        if not self.started:
+            if attrs.get("id") == CHRONOLOGY_ID:
+                self.started = True
+                self.level = self.get_heading_depth()
+            return
+
+        if self.skip_depth is not None:
+            return
+
+        # Citation marks, tables, images, galleries and edit links are skipped.
+        if tag in CHRONOLOGY_SKIP_TAGS or CHRONOLOGY_SKIP_CLASSES.intersection(classes):
+            self.skip_depth = depth
+            return
+
+        if self.capture_depth is not None:
+            return
+
+        path = self.stack[self.level:]
+
+        # New style headings are wrapped in a div.
+        if path and path[0][0] == "div" and "mw-heading" in path[0][1]:
+            path = path[1:]
+
+        if (len(path) == 1 and tag in ("h3", "p")) or (
+                tag == "li" and path[0][0] in ("ul", "ol")):
+            self.capture_depth = depth
+            self.text = list()
+
+    def handle_endtag(self, tag):
+
+        if self.done or tag in VOID_TAGS:
+            return
+
+        # Unmatched end tags are ignored, unclosed elements are closed with their parent.
+        if tag not in [open_tag for open_tag, _ in self.stack]:
+            return
+
+        while self.stack:
+            open_tag, _ = self.stack.pop()
+            depth = len(self.stack)
+
+            if depth == self.skip_depth:
+                self.skip_depth = None
+
+            if depth == self.capture_depth:
+                self.add_entry(open_tag)
+
+            if open_tag == tag:
+                break
+
+        # The element that contains the section was closed.
+        if self.started and len(self.stack) < self.level:
+            self.done = True
+
+    def handle_data(self, data):
+
+        if self.capture_depth is not None and self.skip_depth is None and not self.done:
+            self.text.append(data)
+
+    def get_heading_depth(self):
+        """Gets the depth of the section heading, its siblings are the top of the section."""
+
+        depth = len(self.stack) - 1
+
+        for index, (tag, _) in enumerate(self.stack):
+            if tag == "h2":
+                depth = index
+
+        if depth > 0 and "mw-heading" in self.stack[depth - 1][1]:
+            depth -= 1
+
+        return depth
+
+    def add_entry(self, tag):
+        """Adds the text of the captured element to the entries."""
+
+        text = "".join(self.text)
+
+        # Clean up and formatting.
+        if tag == "h3":
+            self.entries.append(["h3", text.replace("\n", "").replace("[editar]", "").strip()])
+        else:
+            self.entries.append(["p", text.replace("\t", "").replace("\n", " ").strip()])
+
+        self.capture_depth = None
+
+
+def parse_chronology(chunks):
+    """Extracts the chronology section of the Wikipedia page.
+
+    Parameters
+    ----------
+    chunks : iterable
+        The page contents as one or more strings, no more chunks are
+        read once the section ends.
+
+    Returns
+    -------
+    list
+        A list of [tag name, text] pairs, the tag name is h3 for the
+        headings of each day and p for the paragraphs.
+
+    """
+
+    parser = ChronologyParser()
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+        if parser.done:
+            break
+
+    # Without the heading the section would be published empty.
+    if not parser.started:
+        raise ValueError("The chronology section was not found")
+
+    return parser.entries
+
+
+def render_chronology(entries):
+    """Renders the chronology.
+
+    Parameters
+    ----------
+    entries : list
+        The value returned by get_chronology_data().
 
     Returns
     -------
@@ -78,113 +590,94 @@ def get_chronology():
 
     """
 
-    url = "https://es.wikipedia.org/wiki/Pandemia_de_enfermedad_por_coronavirus_de_2020_en_M%C3%A9xico"
-    chronology_text = ""
+    parts = list()
 
-    with requests.get(url, headers=HEADERS) as response:
+    for name, text in entries:
+        if name == "h3":
+            parts.append("#### {}\n\n".format(text))
+        else:
+            parts.append("> {}\n\n".format(text))
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        [tag.extract() for tag in soup("sup")]
+    return "".join(parts)
 
-        # First we look for the chronology section.
-        chronology = soup.find("span", {"id": "Cronología"})
 
-        for item in chronology.parent.next_siblings:
-
-            # We only add the paragraphs to our list, if we find an h4 tag
-            # we break the loop since it means we are in the next day.
-            if item.name == "h2":
-                break
-            elif item.name == "h3":
-                # Clean up and formatting.
-                chronology_text += "#### {}\n\n".format(
-                    item.text.replace("\n", "").replace("[editar]", "").strip())
-            elif item.name == "p":
-                chronology_text += "> {}\n\n".format(
-                    item.text.replace("\t", "").replace("\n", " ").strip())
-            elif item.name == "ul":
-                for listitem in item.find_all("li"):
-                    chronology_text += "> {}\n\n".format(
-                        listitem.text.replace("\t", "").replace("\n", " ").strip())
-
-    return chronology_text
-
-
-def get_international_epidemiology():
+def get_international_data():
     """Gets the epidemiology table from Wikipedia.
 
+    Returns
+    -------
+    list
+        The value returned by parse_international_epidemiology().
+
+    """
+
+    with httpclient.get(INTERNATIONAL_URL) as response:
+        return parsepool.run(parse_international_epidemiology, response.text)
+
+
+def normalize_country(name):
+    """Normalizes a country name so it can be used as an index key.
+
+    Parameters
+    ----------
+    name : str
+        The country name as it appears on the table.
+
     Returns
     -------
     str
-        A Markdown formatted table containing the values from each country.
+        The lowercase name without footnote marks and extra spaces.
 
     """
 
-    # This dict contains the requested countries by the community.
-    countries = {
-        "Mexico": "México",
-        "United States": "EE. UU.",
-        "Pakistan": "Pakistán",
-        "Italy": "Italia",
-        "Japan": "Japón",
-        "China (mainland)": "China",
-        "China": "China",
-        "Finland": "Finlandia",
-        "Turkey": "Turquía",
-        "Spain": "España",
-        "Russia": "Rusia",
-        "Iran": "Irán",
-        "South Africa": "Sudáfrica",
-        "Peru": "Perú",
-        "South Korea": "Corea del Sur",
-        "Brazil": "Brasil",
-        "Ecuador": "Ecuador",
-        "Argentina": "Argentina",
-        "Chile": "Chile",
-        "Netherlands": "Países Bajos",
-        "Sweden": "Suecia",
-        "Norway": "Noruega",
-        "Philippines": "Filipinas",
-        "France": "Francia",
-        "Germany": "Alemania",
-        "United Kingdom": "Reino Unido",
-        "Switzerland": "Suiza",
-        "India": "India",
-        "Colombia": "Colombia"
-    }
+    return " ".join(name.split("[")[0].replace("*", "").split()).lower()
+
+
+def parse_international_epidemiology(html):
+    """Extracts the epidemiology table from the Wikipedia template page.
+
+    Parameters
+    ----------
+    html : str
+        The page contents.
+
+    Returns
+    -------
+    list
+        A list of [country, cases, deaths] rows, the last one has the global totals.
 
-    url = "https://en.wikipedia.org/wiki/Template:2019%E2%80%9320_coronavirus_pandemic_data"
-    table_text = "| País | Casos Confirmados | Defunciones ^\(%) |\n| -- | -- | -- |\n"
+    """
+
+    from bs4 import BeautifulSoup
 
-    with requests.get(url, headers=HEADERS) as response:
+    soup = BeautifulSoup(html.replace("–", "0").replace(
+        "—", "0").replace("No data", "0"), "html.parser")
 
-        soup = BeautifulSoup(response.text.replace("–", "0").replace(
-            "—", "0").replace("No data", "0"), "html.parser")
+    [tag.extract() for tag in soup("sup")]
 
-        [tag.extract() for tag in soup("sup")]
+    rows = soup.find("table", "wikitable").find_all("tr")
+    data = list()
 
-        for row in soup.find("table", "wikitable").find_all("tr"):
+    for row in rows:
 
-            for k, v in countries.items():
+        # The country name is in one of the first cells of the row.
+        for cell in row.find_all(["th", "td"], limit=COUNTRY_CELLS):
+            country = COUNTRY_INDEX.get(normalize_country(cell.text))
 
-                if k in row.text.strip():
-                    tds = row.find_all("td")
+            if country is not None:
+                break
+        else:
+            continue
 
-                    cases = int(tds[2].text.replace(",", "").strip())
-                    deaths = int(tds[3].text.replace(",", "").strip())
+        tds = row.find_all("td")
 
-                    table_text += "| {} | {:,} | {:,} ^{}% |\n".format(
-                        v,
-                        cases,
-                        deaths,
-                        round(deaths / cases * 100, 2)
-                    )
+        cases = int(tds[2].text.replace(",", "").strip())
+        deaths = int(tds[3].text.replace(",", "").strip())
 
-                    break
+        data.append([country, cases, deaths])
 
     # Add the totals row.
-    totals_row = soup.find("table", "wikitable").find_all("tr")[
-        1].find_all("td")
+    totals_row = rows[1].find_all("td")
 
     cases = int(totals_row[2].text.encode(
         "ascii", "ignore").decode("utf-8").replace(",", "").strip())
@@ -192,75 +685,144 @@ def get_international_epidemiology():
     deaths = int(totals_row[3].text.encode(
         "ascii", "ignore").decode("utf-8").replace(",", "").strip())
 
-    table_text += "| __{}__ | __{:,}__ | __{:,} ^{}%__ |\n".format(
-        "Global",
+    data.append(["Global", cases, deaths])
+
+    return data
+
+
+def render_international(data):
+    """Renders the international epidemiology table.
+
+    Parameters
+    ----------
+    data : list
+        The value returned by parse_international_epidemiology().
+
+    Returns
+    -------
+    str
+        A Markdown formatted table containing the values from each country.
+
+    """
+
+    parts = ["| País | Casos Confirmados | Defunciones ^\\(%) |\n| -- | -- | -- |\n"]
+
+    for country, cases, deaths in data[:-1]:
+        parts.append("| {} | {:,} | {:,} ^{}% |\n".format(
+            country,
+            cases,
+            deaths,
+            round(deaths / cases * 100, 2)
+        ))
+
+    country, cases, deaths = data[-1]
+
+    parts.append("| __{}__ | __{:,}__ | __{:,} ^{}%__ |\n".format(
+        country,
         cases,
         deaths,
         round(deaths / cases * 100, 2)
-    )
+    ))
 
-    return table_text
+    return "".join(parts)
 
 
-def get_national_epidemiology():
+def get_national_data():
     """Gets the epidemiology table from Wikipedia.
 
     Returns
     -------
-    str
-        A Markdown formatted table containing the values from each state.
+    list
+        A list of [state, cases, deaths, recoveries] rows.
 
     """
 
-    url = "https://en.wikipedia.org/wiki/COVID-19_pandemic_in_Mexico"
-    table_text = "| Estado | Casos Confirmados | Defunciones ^\(%) | Recuperados ^\(%) |\n| -- | -- | -- | -- |\n"
+    with httpclient.get(NATIONAL_URL) as response:
+        return parsepool.run(parse_national_epidemiology, response.text)
+
+
+def parse_national_epidemiology(html):
+    """Extracts the epidemiology table of each state from the Wikipedia page.
+
+    Parameters
+    ----------
+    html : str
+        The page contents.
+
+    Returns
+    -------
+    list
+        A list of [state, cases, deaths, recoveries] rows.
+
+    """
 
-    with requests.get(url, headers=HEADERS) as response:
+    data = list()
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        [tag.extract() for tag in soup("sup")]
+    from bs4 import BeautifulSoup
 
-        total_cases = 0
-        total_deaths = 0
-        total_recoveries = 0
+    soup = BeautifulSoup(html, "html.parser")
+    [tag.extract() for tag in soup("sup")]
 
-        for row in soup.find("table", "wikitable").find_all("tr")[2:-1]:
+    for row in soup.find("table", "wikitable").find_all("tr")[2:-1]:
 
-            state = row.find("th").text.replace(
-                "\t", "").replace("\n", " ").strip()
+        state = row.find("th").text.replace(
+            "\t", "").replace("\n", " ").strip()
+
+        tds = [td.text.encode("ascii", "ignore").decode(
+            "utf-8").replace(",", "").replace("-", "0").strip() for td in row.find_all("td")]
+
+        data.append([state, int(tds[0]), int(tds[2]), int(tds[3])])
+
+    return data
+
+
+def render_national(data):
+    """Renders the national epidemiology table.
+
+    Parameters
+    ----------
+    data : list
+        The value returned by get_national_data().
+
+    Returns
+    -------
+    str
+        A Markdown formatted table containing the values from each state.
+
+    """
 
-            tds = [td.text.encode("ascii", "ignore").decode(
-                "utf-8").replace(",", "").replace("-", "0").strip() for td in row.find_all("td")]
+    parts = ["| Estado | Casos Confirmados | Defunciones ^\\(%) | Recuperados ^\\(%) |\n| -- | -- | -- | -- |\n"]
 
-            cases = int(tds[0])
-            total_cases += cases
+    total_cases = 0
+    total_deaths = 0
+    total_recoveries = 0
 
-            deaths = int(tds[2])
-            total_deaths += deaths
+    for state, cases, deaths, recoveries in data:
 
-            recoveries = int(tds[3])
-            total_recoveries += recoveries
+        total_cases += cases
+        total_deaths += deaths
+        total_recoveries += recoveries
 
-            table_text += "| {} | {:,} | {:,} ^{}% | {:,} ^{}% |\n".format(
-                state,
-                cases,
-                deaths,
-                round(deaths / cases * 100, 2),
-                recoveries,
-                round(recoveries / cases * 100, 2)
-            )
+        parts.append("| {} | {:,} | {:,} ^{}% | {:,} ^{}% |\n".format(
+            state,
+            cases,
+            deaths,
+            round(deaths / cases * 100, 2),
+            recoveries,
+            round(recoveries / cases * 100, 2)
+        ))
 
     # Add the totals row.
-    table_text += "| __{}__ | __{:,}__ | __{:,} ^{}%__ | __{:,} ^{}%__ |\n".format(
+    parts.append("| __{}__ | __{:,}__ | __{:,} ^{}%__ | __{:,} ^{}%__ |\n".format(
         "Total",
         total_cases,
         total_deaths,
         round(total_deaths / total_cases * 100, 2),
         total_recoveries,
         round(total_recoveries / total_cases * 100, 2)
-    )
+    ))
 
-    return table_text
+    return "".join(parts)
 
 
 if __name__ == "__main__":
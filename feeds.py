@@ -0,0 +1,211 @@
+"""
+Incremental reading of RSS feeds.
+
+The ETag, Last-Modified and the ids of the recently seen items of each
+feed are kept in a local state file, this way unchanged feeds only cost
+a 304 response.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import httpclient
+import metrics
+
+STATE_FILE = "./feeds.json"
+
+# How many item ids are remembered per feed.
+MAX_SEEN = 500
+
+Item = namedtuple("Item", ["title", "link", "guid", "pub_date"])
+
+
+def load_state():
+    """Loads the feeds state file.
+
+    Returns
+    -------
+    dict
+        A dict of feed urls and their saved state.
+
+    """
+
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def save_state(state):
+    """Saves the feeds state file.
+
+    Parameters
+    ----------
+    state : dict
+        A dict of feed urls and their saved state.
+
+    """
+
+    temp_name = STATE_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(state, temp_file, ensure_ascii=False)
+
+    os.replace(temp_name, STATE_FILE)
+
+
+def get_item_id(item):
+    """Identifies an item by its guid, or its link when it has no guid.
+
+    Parameters
+    ----------
+    item : Item
+        The feed item.
+
+    Returns
+    -------
+    str
+        The item id.
+
+    """
+
+    return item.guid or item.link
+
+
+def iter_items(stream, limit):
+    """Reads the first items from a RSS document without loading all of it.
+
+    Elements are discarded as soon as they are read and reading stops
+    once enough items were produced.
+
+    Parameters
+    ----------
+    stream : file-like object
+        A binary stream containing the RSS document.
+
+    limit : int
+        The max number of items to read.
+
+    Yields
+    ------
+    Item
+        The title, link, guid and pubDate of each item.
+
+    """
+
+    if limit <= 0:
+        return
+
+    count = 0
+    channel = None
+
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+
+        if event == "start":
+            if element.tag == "channel":
+                channel = element
+            continue
+
+        if element.tag != "item":
+            continue
+
+        yield Item(
+            element.findtext("title", ""),
+            element.findtext("link", ""),
+            element.findtext("guid", ""),
+            element.findtext("pubDate", "")
+        )
+
+        # Free the item and everything read before it.
+        element.clear()
+
+        if channel is not None:
+            channel.clear()
+
+        count += 1
+
+        if count >= limit:
+            return
+
+
+def read_feed(url, limit, state, headers=None, only_new=True):
+    """Reads a feed using a conditional request.
+
+    Parameters
+    ----------
+    url : str
+        The feed url.
+
+    limit : int
+        The max number of items to read.
+
+    state : dict
+        The dict returned by load_state(), it is updated in place.
+
+    headers : dict
+        Extra request headers.
+
+    only_new : bool
+        If True only the items whose guid or link wasn't seen before are
+        returned, the feed order is not used since search feeds are
+        sorted by relevance. If False the latest items are always
+        returned, reusing the saved ones when the feed didn't change.
+
+    Returns
+    -------
+    list
+        A list of Item.
+
+    """
+
+    feed_state = state.setdefault(url, dict())
+    request_headers = dict(headers or {})
+
+    if feed_state.get("etag"):
+        request_headers["If-None-Match"] = feed_state["etag"]
+
+    if feed_state.get("last_modified"):
+        request_headers["If-Modified-Since"] = feed_state["last_modified"]
+
+    seen = feed_state.get("seen", [])
+    seen_ids = set(seen)
+    items = list()
+
+    with httpclient.get(url, headers=request_headers, stream=True) as response:
+
+        if response.status_code == 304:
+            metrics.count("feed_not_modified")
+
+            if only_new:
+                return []
+
+            return [Item(*item) for item in feed_state.get("items", [])]
+
+        response.raise_for_status()
+        response.raw.decode_content = True
+
+        feed_state["etag"] = response.headers.get("ETag", "")
+        feed_state["last_modified"] = response.headers.get("Last-Modified", "")
+
+        items = list(iter_items(response.raw, limit))
+
+    new_items = [item for item in items if get_item_id(item) not in seen_ids]
+
+    # The newest ids go first and the oldest ones are forgotten.
+    new_ids = list(dict.fromkeys(get_item_id(item) for item in new_items))
+    feed_state["seen"] = (new_ids + seen)[:MAX_SEEN]
+
+    # State saved by older versions.
+    feed_state.pop("guid", None)
+    feed_state.pop("pub_date", None)
+
+    feed_state["items"] = items
+
+    if only_new:
+        return new_items
+
+    return items
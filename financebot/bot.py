@@ -3,18 +3,23 @@ This bot performs a bit of web scraping to get current values
 of several currency pairs and financial instruments.
 """
 
+import json
+import os
+import threading
 import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-
-import praw
-import requests
-from bs4 import BeautifulSoup
-from openpyxl import load_workbook
+from io import BytesIO
+from urllib.parse import urlparse
 
 import config
-
-HEADERS = {
-    "User-Agent": "FinanceBot v0.3"}
+import httpclient
+import metrics
+import parsepool
+import redditclient
+import writegate
+import writequeue
 
 INVESTING_DICT = {
     "USD/MXN": "https://mx.investing.com/currencies/usd-mxn",
@@ -24,17 +29,125 @@ INVESTING_DICT = {
     "IPC (BMV)": "https://mx.investing.com/indices/ipc"
 }
 
+# Only the elements containing the price and the percentage are parsed.
+PRICE_ATTRS = {"data-test": ["instrument-price-last", "instrument-price-change-percent"]}
+LEGACY_PRICE_ATTRS = {"class": "top bold inlineblock"}
+
+# Each host allows a burst of this many requests and then one request
+# every RATE_INTERVAL seconds.
+RATE_BURST = 2
+RATE_INTERVAL = 1.0
+
+MAX_WORKERS = 4
+
+# Unchanged data is published again after this many seconds.
+MAX_UNCHANGED_AGE = 60 * 60 * 24
+
+WIDGET_NAME = "Indicadores Financieros"
+WIDGET_FILE = "./widget.json"
+
 BANXICO1_URL = "https://www.banxico.org.mx/SieInternet/consultarDirectorioInternetAction.do?sector=22&accion=consultarCuadro&idCuadro=CF107&locale=es&formatoXLS.x=1&fechaInicio={}&fechaFin={}"
 BANXICO2_URL = "https://www.banxico.org.mx/SieInternet/consultarDirectorioInternetAction.do?accion=consultarCuadro&idCuadro=CF114&formatoXLS.x=1&fechaInicio={}&fechaFin={}"
 
+# Each Banxico workbook and how many days are requested when there are no stored values.
+BANXICO_SOURCES = {
+    "banxico1": (BANXICO1_URL, 21),
+    "banxico2": (BANXICO2_URL, 120)
+}
+
+# The name, workbook, row and suffix of each Banxico instrument, in the table order.
+BANXICO_INSTRUMENTS = [
+    ("CETES 1 mes", "banxico1", 16, ""),
+    ("CETES 3 meses", "banxico1", 20, ""),
+    ("CETES 6 meses", "banxico1", 24, ""),
+    ("CETES 1 año", "banxico1", 28, ""),
+    ("BONOS 3 años", "banxico2", 29, ""),
+    ("BONOS 5 años", "banxico2", 30, ""),
+    ("BONOS 10 años", "banxico2", 32, ""),
+    ("BONOS 20 años", "banxico2", 33, ""),
+    ("BONOS 30 años", "banxico2", 34, ""),
+    ("UDIBONOS 3 años", "banxico2", 23, " (más inflación)"),
+    ("UDIBONOS 10 años", "banxico2", 25, " (más inflación)"),
+    ("UDIBONOS 20 años", "banxico2", 26, " (más inflación)"),
+    ("UDIBONOS 30 años", "banxico2", 27, " (más inflación)")
+]
+
+# The stored values of each instrument, see load_series().
+SERIES_DIR = "./series"
+
+# When each Banxico workbook was last downloaded, see load_fetched().
+FETCHED_FILE = "./series/fetched.json"
+
+# Banxico publishes the values of a business day after this hour.
+BANXICO_PUBLISH_HOUR = 14
+
+
+class TokenBucket:
+    """A thread safe token bucket used to limit the requests to a host.
+
+    Parameters
+    ----------
+    burst : int
+        The max number of tokens the bucket can hold.
+
+    interval : float
+        The seconds it takes to add a new token.
+
+    """
+
+    def __init__(self, burst, interval):
+        self.burst = burst
+        self.interval = interval
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting until one is available."""
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.updated) / self.interval)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) * self.interval
+
+            time.sleep(wait)
+
+
+BUCKETS = dict()
+BUCKETS_LOCK = threading.Lock()
+
+
+def wait_for_host(url):
+    """Waits until a request to the url host is allowed.
+
+    Parameters
+    ----------
+    url : str
+        The url that is going to be requested.
+
+    """
+
+    host = urlparse(url).netloc
+
+    with BUCKETS_LOCK:
+        bucket = BUCKETS.setdefault(host, TokenBucket(RATE_BURST, RATE_INTERVAL))
+
+    bucket.acquire()
+
 
 def init_bot():
     """Inits the bot."""
 
-    # We create the Reddit instance.
-    reddit = praw.Reddit(client_id=config.APP_ID, client_secret=config.APP_SECRET,
-                         user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
-                         password=config.REDDIT_PASSWORD)
+    # We get the shared Reddit instance.
+    reddit = redditclient.get_reddit()
 
     # Load the pre-existing sirebar text.
     sidebar_text = open("sidebar.txt", "r", encoding="utf-8").read()
@@ -42,35 +155,155 @@ def init_bot():
     # Start the Markdown table with 3 columns.
     table_text = """\n\n| | | |\n| --- | --- | --- |\n"""
 
-    # We iterate over INVESTING_DICT and call the same function.
-    for k, v in INVESTING_DICT.items():
+    # The parse workers are forked before any thread is started.
+    parsepool.start()
 
-        temp_data = get_investing_data(k, v)
+    # We request all of INVESTING_DICT at the same time, the results
+    # keep the same order.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(get_investing_data,
+                               INVESTING_DICT.keys(), INVESTING_DICT.values())
 
-        # Add the data to the Markdown table.
-        table_text += "| {} | {} | {} |\n".format(
-            temp_data[0], temp_data[1], temp_data[2])
+        for temp_data in results:
 
-        time.sleep(1)
+            # Add the data to the Markdown table.
+            table_text += "| {} | {} | {} |\n".format(
+                temp_data[0], temp_data[1], temp_data[2])
 
-    # We add the rest of financial instruments.
+    # We add the rest of financial instruments with their change since the previous day.
     for item in get_cetes():
-        table_text += "| {} | | {} |\n".format(item[0], item[1])
+        table_text += "| {} | {} | {} |\n".format(item[0], item[2], item[1])
 
     # Prepare the footer with the current date and time.
     now = datetime.now()
     footer = "\nÚltima actualización: {:%d-%m-%Y a las %H:%M:%S}".format(now)
 
-    # Update the sidebar on old Reddit.
-    reddit.subreddit(
-        config.SUBREDDIT).wiki["config/sidebar"].edit(sidebar_text + table_text + footer)
+    # Update the sidebar on old Reddit, only if the values changed.
+    wiki_target = "{}/wiki/config/sidebar".format(config.SUBREDDIT)
+    wiki_changed = writegate.has_changed(wiki_target, sidebar_text + table_text, MAX_UNCHANGED_AGE)
+
+    if wiki_changed:
+        writequeue.enqueue(wiki_target, "wiki_edit", subreddit=config.SUBREDDIT,
+                           page="config/sidebar", content=sidebar_text + table_text + footer)
+
+    # Update a sidebar text widget on new Reddit, only if the values changed.
+    widget_target = "{}/widgets/{}".format(config.SUBREDDIT, WIDGET_NAME)
+    widget_changed = writegate.has_changed(widget_target, table_text, MAX_UNCHANGED_AGE)
+
+    if widget_changed:
+        enqueue_widget_update(reddit, widget_target, table_text + footer)
+
+    results, errors = writequeue.flush(reddit)
+
+    # The saved widget id may be stale, we look for the widget again and retry once.
+    if widget_target in errors and is_rejected(errors[widget_target]):
+        print("Saved widget id was rejected, looking for the widget again.")
+
+        if enqueue_widget_update(reddit, widget_target, table_text + footer, rescan=True):
+            results.update(writequeue.flush(reddit)[0])
+
+    if wiki_changed and wiki_target in results:
+        writegate.mark_published(wiki_target, sidebar_text + table_text)
+
+    if widget_changed and widget_target in results:
+        writegate.mark_published(widget_target, table_text)
+
+
+def is_rejected(error):
+    """Checks if Reddit rejected a widget update because of its id.
+
+    Parameters
+    ----------
+    error : Exception
+        The error of the widget update.
+
+    Returns
+    -------
+    bool
+        True if the widget must be looked for again.
+
+    """
+
+    import praw
+    import prawcore
 
-    # Update a sidebar text widget on new Reddit.
-    for widget in reddit.subreddit(config.SUBREDDIT).widgets.sidebar:
+    return isinstance(error, (prawcore.exceptions.NotFound, prawcore.exceptions.BadRequest,
+                              praw.exceptions.RedditAPIException))
 
-        if widget.shortName == "Indicadores Financieros":
-            widget.mod.update(text=table_text + footer)
-            break
+
+def enqueue_widget_update(reddit, target, text, rescan=False):
+    """Queues an update of the sidebar text widget on new Reddit.
+
+    The widget id is saved locally so we don't have to iterate over
+    all the widgets on every run, the widgets are only requested again
+    when the saved id is missing or rejected.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    target : str
+        The key of the write.
+
+    text : str
+        The new widget text.
+
+    rescan : bool
+        Whether to ignore the saved widget id.
+
+    Returns
+    -------
+    bool
+        False if the widget wasn't found.
+
+    """
+
+    widget_data = None
+
+    if not rescan:
+        try:
+            with open(WIDGET_FILE, "r", encoding="utf-8") as temp_file:
+                widget_data = json.load(temp_file)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    if not widget_data:
+
+        for widget in reddit.subreddit(config.SUBREDDIT).widgets.sidebar:
+
+            if widget.shortName == WIDGET_NAME:
+
+                # We only keep the fields needed to update the widget.
+                widget_data = {
+                    "id": widget.id,
+                    "kind": widget.kind,
+                    "shortName": widget.shortName
+                }
+
+                if getattr(widget, "styles", None):
+                    widget_data["styles"] = widget.styles
+
+                # Written to a temporary file first so a crash never leaves it half written.
+                temp_name = WIDGET_FILE + ".tmp"
+
+                with open(temp_name, "w", encoding="utf-8") as temp_file:
+                    json.dump(widget_data, temp_file)
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+
+                os.replace(temp_name, WIDGET_FILE)
+
+                break
+
+    if not widget_data:
+        print("Widget {} not found.".format(WIDGET_NAME))
+        return False
+
+    writequeue.enqueue(target, "widget_update", subreddit=config.SUBREDDIT,
+                       widget=widget_data, text=text)
+
+    return True
 
 
 def get_investing_data(name, url):
@@ -91,121 +324,407 @@ def get_investing_data(name, url):
 
     """
 
-    with requests.get(url, headers=HEADERS) as response:
+    with metrics.timer("rate_wait", source=name):
+        wait_for_host(url)
 
-        soup = BeautifulSoup(response.text, "html.parser")
+    with metrics.timer("fetch", source=name):
+        response = httpclient.get(url)
 
-        try:
-            latest_data = soup.find(
-                "div", {"class": "top bold inlineblock"}).text.strip().split()
+    with response, metrics.timer("parse", source=name):
+        return parsepool.run(parse_investing_data, name, response.text)
 
-            price = latest_data[0]
-            percentage = latest_data[2]
-        except:
-            price = soup.find(
-                "span", {"data-test": "instrument-price-last"}).text.strip()
 
-            percentage = soup.find(
-                "span", {"data-test": "instrument-price-change-percent"}).text.strip()[1:-1]
+def parse_investing_data(name, html):
+    """Extracts the price and percentage from an investing.com page.
 
-        return (name, price, percentage)
+    Only the elements that contain the values are parsed, the rest
+    of the page is skipped.
+
+    Parameters
+    ----------
+    name : str
+        The name of the currency pair.
+
+    html : str
+        The page contents.
+
+    Returns
+    -------
+    tuple
+         A Tuple containing 3 values.
+
+    """
+
+    # Heavy modules are imported only when they are needed.
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(attrs=PRICE_ATTRS))
+
+    price = soup.find("span", {"data-test": "instrument-price-last"})
+    percentage = soup.find("span", {"data-test": "instrument-price-change-percent"})
+
+    if price is not None and percentage is not None:
+        return (name, price.text.strip(), percentage.text.strip()[1:-1])
+
+    # Older pages keep all the values in a single div.
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("div", LEGACY_PRICE_ATTRS))
+
+    latest_data = soup.find(
+        "div", {"class": "top bold inlineblock"}).text.strip().split()
+
+    return (name, latest_data[0], latest_data[2])
 
 
 def get_cetes():
     """Gets data from Banxico Excel archives.
-    It first downloads the Excel files and then reads
-    cell values from the specified rows.
+
+    The values are kept in a local series per instrument under the date
+    Banxico published them. A workbook is not downloaded again until
+    Banxico publishes new values, some instruments are auctioned once a
+    week so their stored dates can't tell when that happens. Only the
+    dates since the last stored value are requested and only values
+    newer than the stored ones are added.
 
     Returns
     -------
     list
-        A list of several financial instruments.
+        A list of [name, value, change since the previous published value]
+        of several financial instruments.
 
     """
 
-    # The Excel files are behind a simple GET request.
-    # Two of the parameters are UNIX timestamps.
     now = datetime.now()
-    now_ts = int(now.timestamp()) * 1000
+    today = now.date().toordinal()
+    published_at = get_latest_publication(now)
 
-    last_21_days = now - timedelta(days=21)
-    last_21_days_ts = int(last_21_days.timestamp()) * 1000
+    series = {(source, row): load_series(source, row) for _, source, row, _ in BANXICO_INSTRUMENTS}
+    fetched = load_fetched()
 
-    last_120_days = now - timedelta(days=120)
-    last_120_days_ts = int(last_120_days.timestamp()) * 1000
+    for source, (url, days) in BANXICO_SOURCES.items():
 
-    # With our timestamps ready we download both files.
-    with requests.get(BANXICO1_URL.format(last_21_days_ts, now_ts)) as response:
-        with open("./banxico1.xlsx", "wb") as temp_file:
-            temp_file.write(response.content)
+        keys = [key for key in series if key[0] == source]
+        last_days = [series[key][-2] if series[key] else None for key in keys]
 
-    with requests.get(BANXICO2_URL.format(last_120_days_ts, now_ts)) as response:
-        with open("./banxico2.xlsx", "wb") as temp_file:
-            temp_file.write(response.content)
+        # Nothing was published since the last download.
+        if source in fetched and datetime.fromisoformat(fetched[source]) >= published_at:
+            metrics.count("banxico_skipped", source=source)
+            continue
 
-    # We open both files and start extracting the values we need.
-    book1 = load_workbook("banxico1.xlsx")
-    sheet1 = book1.worksheets[0]
+        # The Excel files are behind a simple GET request.
+        # Two of the parameters are UNIX timestamps.
+        start = now - timedelta(days=days)
 
-    book2 = load_workbook("banxico2.xlsx")
-    sheet2 = book2.worksheets[0]
+        if None not in last_days:
+            start = max(start, datetime.fromordinal(int(min(last_days))))
 
-    data_list = list()
+        with metrics.timer("fetch", source=source):
+            response = httpclient.get(url.format(int(start.timestamp()) * 1000,
+                                                 int(now.timestamp()) * 1000))
+
+        with response, metrics.timer("excel", source=source):
+            values = read_rows(response.content, [key[1] for key in keys])
 
-    data_list.append(["CETES 1 mes", "+{}%".format(find_value(sheet1, 16))])
-    data_list.append(["CETES 3 meses", "+{}%".format(find_value(sheet1, 20))])
-    data_list.append(["CETES 6 meses", "+{}%".format(find_value(sheet1, 24))])
-    data_list.append(["CETES 1 año", "+{}%".format(find_value(sheet1, 28))])
+        for key in keys:
+            day, value = values.get(key[1], (None, None))
 
-    data_list.append(["BONOS 3 años", "+{}%".format(find_value(sheet2, 29))])
-    data_list.append(["BONOS 5 años", "+{}%".format(find_value(sheet2, 30))])
-    data_list.append(["BONOS 10 años", "+{}%".format(find_value(sheet2, 32))])
-    data_list.append(["BONOS 20 años", "+{}%".format(find_value(sheet2, 33))])
-    data_list.append(["BONOS 30 años", "+{}%".format(find_value(sheet2, 34))])
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                # No values in the requested dates, the last stored one is used.
+                continue
 
-    data_list.append(
-        ["UDIBONOS 3 años", "+{}% (más inflación)".format(find_value(sheet2, 23))])
+            if day is None:
+                # Without the date row the value is shown but not stored.
+                print("The date of {} row {} was not found.".format(source, key[1]))
+                series[key].extend([today, value])
+            elif not series[key] or day > series[key][-2]:
+                append_series(source, key[1], day, value)
+                series[key].extend([day, value])
 
-    data_list.append(
-        ["UDIBONOS 10 años", "+{}% (más inflación)".format(find_value(sheet2, 25))])
+        fetched[source] = now.isoformat()
+        save_fetched(fetched)
 
-    data_list.append(
-        ["UDIBONOS 20 años", "+{}% (más inflación)".format(find_value(sheet2, 26))])
+    data_list = list()
+
+    for name, source, row, suffix in BANXICO_INSTRUMENTS:
+
+        values = series[(source, row)]
+
+        if not values:
+            data_list.append([name, "N/E", ""])
+            continue
 
-    data_list.append(
-        ["UDIBONOS 30 años", "+{}% (más inflación)".format(find_value(sheet2, 27))])
+        # The change is against the previous published value.
+        change = "{:+.2f}".format(values[-1] - values[-3]) if len(values) > 2 else ""
+
+        data_list.append([name, "+{}%{}".format(values[-1], suffix), change])
 
     return data_list
 
 
-def find_value(sheet, row_number):
+def get_latest_business_day(day):
+    """Gets the latest weekday on or before a date, Banxico doesn't publish on weekends.
+
+    Parameters
+    ----------
+    day : date
+        The date.
+
+    Returns
+    -------
+    date
+        The same date or the previous Friday.
+
+    """
+
+    return day - timedelta(days=max(day.weekday() - 4, 0))
+
+
+def get_latest_publication(moment):
+    """Gets when Banxico last published new values.
+
+    Parameters
+    ----------
+    moment : datetime
+        The current time.
+
+    Returns
+    -------
+    datetime
+        The publish time of the latest business day whose values are
+        already published.
+
+    """
+
+    day = moment.date()
+
+    if moment.hour < BANXICO_PUBLISH_HOUR:
+        day -= timedelta(days=1)
+
+    day = get_latest_business_day(day)
+
+    return datetime(day.year, day.month, day.day, BANXICO_PUBLISH_HOUR)
+
+
+def load_fetched():
+    """Loads when each Banxico workbook was last downloaded.
+
+    Returns
+    -------
+    dict
+        A dict of the keys in BANXICO_SOURCES and the ISO time of their
+        last download.
+
+    """
+
+    try:
+        with open(FETCHED_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def save_fetched(fetched):
+    """Saves when each Banxico workbook was last downloaded.
+
+    Parameters
+    ----------
+    fetched : dict
+        A dict of the keys in BANXICO_SOURCES and the ISO time of their
+        last download.
+
+    """
+
+    os.makedirs(os.path.dirname(FETCHED_FILE), exist_ok=True)
+
+    temp_name = FETCHED_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(fetched, temp_file)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+    os.replace(temp_name, FETCHED_FILE)
+
+
+def series_path(source, row):
+    """Gets the file of an instrument series.
+
+    Parameters
+    ----------
+    source : str
+        The key of the workbook in BANXICO_SOURCES.
+
+    row : int
+        The row of the instrument in the workbook.
+
+    Returns
+    -------
+    str
+        The file path.
+
+    """
+
+    return os.path.join(SERIES_DIR, "{}_{}.bin".format(source, row))
+
+
+def load_series(source, row):
+    """Loads the stored values of an instrument.
+
+    Parameters
+    ----------
+    source : str
+        The key of the workbook in BANXICO_SOURCES.
+
+    row : int
+        The row of the instrument in the workbook.
+
+    Returns
+    -------
+    array
+        The day ordinal and value of each stored day, one after the other.
+
+    """
+
+    values = array("d")
+
+    try:
+        with open(series_path(source, row), "rb") as temp_file:
+            size = os.fstat(temp_file.fileno()).st_size
+
+            # A partially written record at the end is ignored.
+            values.fromfile(temp_file, size // (values.itemsize * 2) * 2)
+    except FileNotFoundError:
+        pass
+
+    return values
+
+
+def append_series(source, row, day, value):
+    """Appends a value to an instrument series.
+
+    Parameters
+    ----------
+    source : str
+        The key of the workbook in BANXICO_SOURCES.
+
+    row : int
+        The row of the instrument in the workbook.
+
+    day : int
+        The day ordinal.
+
+    value : float
+        The value of that day.
+
+    """
+
+    os.makedirs(SERIES_DIR, exist_ok=True)
+
+    with open(series_path(source, row), "ab") as temp_file:
+        array("d", [day, value]).tofile(temp_file)
+
+
+def read_rows(content, row_numbers):
+    """Reads the best available value of the specified rows and its date.
+
+    The workbook is opened in read only mode straight from memory and
+    only the rows up to the last requested row are read. The dates are
+    taken from the last row above the values that contains dates.
+
+    Parameters
+    ----------
+    content : bytes
+        The contents of the Excel file.
+
+    row_numbers : list
+        The rows where the values are located.
+
+    Returns
+    -------
+    dict
+        A dict of row numbers and their (day ordinal, value), the day
+        is None if the file has no date row.
+
+    """
+
+    from openpyxl import load_workbook
+
+    book = load_workbook(BytesIO(content), read_only=True, data_only=True)
+    sheet = book.worksheets[0]
+
+    values = dict()
+    dates = None
+    min_row = min(row_numbers)
+
+    for row_number, row in enumerate(sheet.iter_rows(max_row=max(row_numbers), min_col=2,
+                                                     max_col=5, values_only=True),
+                                     start=1):
+        if row_number < min_row:
+            row_dates = [parse_banxico_date(value) for value in row]
+
+            if any(row_dates):
+                dates = row_dates
+
+        elif row_number in row_numbers:
+            column, value = find_value(row)
+            values[row_number] = (dates[column] if dates and column is not None else None, value)
+
+    book.close()
+
+    return values
+
+
+def parse_banxico_date(value):
+    """Converts a date cell into a day ordinal.
+
+    Parameters
+    ----------
+    value : object
+        The cell value, a datetime or a dd/mm/yyyy string.
+
+    Returns
+    -------
+    int
+        The day ordinal or None if the cell isn't a date.
+
+    """
+
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value.strip(), "%d/%m/%Y").date().toordinal()
+        except ValueError:
+            return None
+
+    return None
+
+
+def find_value(row):
     """Finds the best available value.
 
     Parameters
     ---------
-    sheet : workbook.sheet
-        An Excel sheet.
-
-    row_number : int
-        The row where the value is located.
+    row : tuple
+        The values of the second to fifth columns of a row.
 
     Returns
     -------
-    string
-        The cell value that wasn't 'N/E' (not eligible).
+    tuple
+        The index and value of the cell that wasn't 'N/E' (not eligible),
+        (None, None) if there isn't one.
 
     """
 
     # We first try looking in the fifth column and keep falling
-    # back until we go to the third column.
-    if sheet.cell(row=row_number, column=5).value != "N/E":
-        return sheet.cell(row=row_number, column=5).value
-    elif sheet.cell(row=row_number, column=4).value != "N/E":
-        return sheet.cell(row=row_number, column=4).value
-    elif sheet.cell(row=row_number, column=3).value != "N/E":
-        return sheet.cell(row=row_number, column=3).value
-    elif sheet.cell(row=row_number, column=2).value != "N/E":
-        return sheet.cell(row=row_number, column=2).value
+    # back until we go to the second column.
+    for column in reversed(range(len(row))):
+        if row[column] is not None and row[column] != "N/E":
+            return column, row[column]
+
+    return None, None
 
 
 if __name__ == "__main__":
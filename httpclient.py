@@ -0,0 +1,148 @@
+"""
+Shared HTTP client used by all the bots.
+
+A single requests Session keeps a pool of connections per host, this way
+the TCP and TLS handshakes are only made once per host on each run.
+Requests have timeouts and are retried with a jittered exponential
+backoff when a transient error occurs.
+"""
+
+import os
+import random
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:73.0) Gecko/20100101 Firefox/73.0"
+
+# Connect and read timeouts in seconds.
+TIMEOUT = (5, 30)
+
+# Transient errors are retried this many times.
+RETRIES = 3
+BACKOFF = 1.0
+MAX_DELAY = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# How many hosts keep a pool and how many connections each pool keeps.
+POOL_HOSTS = 10
+POOL_SIZE = 8
+
+# Set the BOT_HTTP_TIMINGS environment variable to print the timing of each request.
+PRINT_TIMINGS = bool(os.environ.get("BOT_HTTP_TIMINGS"))
+
+# Brotli responses are only requested when a brotli decoder is installed.
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+
+session = requests.Session()
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING})
+
+
+def count_connections(url):
+    """Counts the connections opened so far to the url host.
+
+    Parameters
+    ----------
+    url : str
+        The url that is going to be requested.
+
+    Returns
+    -------
+    int
+        The number of connections opened by the host pool.
+
+    """
+
+    host = urlparse(url).hostname
+    pools = adapter.poolmanager.pools
+
+    return sum(pools[key].num_connections for key in pools.keys() if key.key_host == host)
+
+
+def wait_before_retry(attempt, retry_after=None):
+    """Sleeps before retrying a request.
+
+    Parameters
+    ----------
+    attempt : int
+        The number of the failed attempt, starting at 0.
+
+    retry_after : str
+        The value of the Retry-After header, if any.
+
+    """
+
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    time.sleep(min(delay, MAX_DELAY))
+
+
+def get(url, **kwargs):
+    """Performs a GET request using the shared session.
+
+    Parameters
+    ----------
+    url : str
+        The url to request.
+
+    kwargs
+        Any of the requests.get() arguments.
+
+    Returns
+    -------
+    requests.Response
+        The response of the last attempt.
+
+    """
+
+    kwargs.setdefault("timeout", TIMEOUT)
+
+    for attempt in range(RETRIES + 1):
+
+        connections = count_connections(url)
+        start = time.perf_counter()
+
+        try:
+            response = session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == RETRIES:
+                raise
+
+            wait_before_retry(attempt)
+            continue
+
+        elapsed = time.perf_counter() - start
+        new_connection = count_connections(url) > connections
+        metrics.observe("http_request", elapsed, host=urlparse(url).hostname)
+
+        if PRINT_TIMINGS:
+            print("GET {} {} {} {:.3f}s {}".format(
+                urlparse(url).netloc, urlparse(url).path, response.status_code, elapsed,
+                "new connection" if new_connection else "reused connection"))
+
+        if response.status_code in RETRY_STATUSES and attempt < RETRIES:
+            metrics.count("http_retry", host=urlparse(url).hostname)
+            response.close()
+            wait_before_retry(attempt, response.headers.get("Retry-After"))
+            continue
+
+        return response
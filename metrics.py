@@ -0,0 +1,248 @@
+"""
+Optional timings and counters of the bot stages.
+
+Set the BOT_METRICS environment variable to a file path to enable them.
+Paths ending in .prom are written as a Prometheus textfile (for the
+node_exporter textfile collector), any other path gets a JSON line
+appended per run. A {} in the path is replaced with the bot name.
+
+When BOT_METRICS is not set timers and counters do nothing.
+
+BOT_METRICS=/var/lib/node_exporter/textfile/reddit_{}.prom python3 bot.py
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+OUTPUT = os.environ.get("BOT_METRICS")
+ENABLED = bool(OUTPUT)
+
+# Timings as (name, labels) -> [count, total seconds, max seconds] and
+# counters as (name, labels) -> value.
+timings = dict()
+counters = dict()
+
+lock = threading.Lock()
+
+
+class Timer:
+    """Measures the seconds spent in a block or a function.
+
+    Parameters
+    ----------
+    name : str
+        The stage name.
+
+    labels : dict
+        Labels that identify the stage, for example the source.
+
+    """
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def __call__(self, func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Timer(self.name, self.labels):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class NoopTimer:
+    """Used instead of Timer when metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __call__(self, func):
+        return func
+
+
+NOOP_TIMER = NoopTimer()
+
+
+def timer(name, **labels):
+    """Times a block when used with the with statement or a function when used as a decorator.
+
+    Parameters
+    ----------
+    name : str
+        The stage name.
+
+    labels
+        Labels that identify the stage.
+
+    Returns
+    -------
+    Timer
+        A context manager and decorator.
+
+    """
+
+    if not ENABLED:
+        return NOOP_TIMER
+
+    return Timer(name, labels)
+
+
+def observe(name, seconds, **labels):
+    """Records the duration of a stage.
+
+    Parameters
+    ----------
+    name : str
+        The stage name.
+
+    seconds : float
+        How long the stage took.
+
+    labels
+        Labels that identify the stage.
+
+    """
+
+    if not ENABLED:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+
+    with lock:
+        values = timings.setdefault(key, [0, 0.0, 0.0])
+        values[0] += 1
+        values[1] += seconds
+        values[2] = max(values[2], seconds)
+
+
+def count(name, value=1, **labels):
+    """Increments a counter.
+
+    Parameters
+    ----------
+    name : str
+        The counter name.
+
+    value : int
+        How much to increment it.
+
+    labels
+        Labels that identify the counter.
+
+    """
+
+    if not ENABLED:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def format_labels(labels):
+    """Formats labels for the Prometheus text format.
+
+    Parameters
+    ----------
+    labels : tuple
+        A tuple of (name, value) pairs.
+
+    Returns
+    -------
+    str
+        The labels between braces.
+
+    """
+
+    return "{" + ",".join('{}="{}"'.format(
+        k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def write(bot=None):
+    """Writes the metrics recorded since the last call and resets them.
+
+    Parameters
+    ----------
+    bot : str
+        The bot name, by default the name of the current folder.
+
+    """
+
+    if not ENABLED:
+        return
+
+    with lock:
+        recorded_timings = dict(timings)
+        recorded_counters = dict(counters)
+        timings.clear()
+        counters.clear()
+
+    if not recorded_timings and not recorded_counters:
+        return
+
+    if bot is None:
+        bot = os.path.basename(os.getcwd())
+
+    path = OUTPUT.replace("{}", bot)
+
+    if path.endswith(".prom"):
+        lines = list()
+
+        for (name, labels), (total, seconds, longest) in sorted(recorded_timings.items()):
+            labels = format_labels((("bot", bot), ("stage", name)) + labels)
+            lines.append("bot_stage_seconds_sum{} {:.6f}".format(labels, seconds))
+            lines.append("bot_stage_seconds_count{} {}".format(labels, total))
+            lines.append("bot_stage_seconds_max{} {:.6f}".format(labels, longest))
+
+        for (name, labels), value in sorted(recorded_counters.items()):
+            labels = format_labels((("bot", bot), ("counter", name)) + labels)
+            lines.append("bot_events_total{} {}".format(labels, value))
+
+        lines.append("bot_last_run_timestamp_seconds{} {:.0f}".format(
+            format_labels((("bot", bot),)), time.time()))
+
+        # The collector may read the file at any time, it's replaced atomically.
+        temp_name = path + ".tmp"
+
+        with open(temp_name, "w", encoding="utf-8") as temp_file:
+            temp_file.write("\n".join(lines) + "\n")
+
+        os.replace(temp_name, path)
+
+    else:
+        record = {
+            "time": time.time(),
+            "bot": bot,
+            "timings": [dict(labels, stage=name, count=total, seconds=round(seconds, 6),
+                             max=round(longest, 6))
+                        for (name, labels), (total, seconds, longest) in recorded_timings.items()],
+            "counters": [dict(labels, counter=name, value=value)
+                         for (name, labels), value in recorded_counters.items()]
+        }
+
+        with open(path, "a", encoding="utf-8") as temp_file:
+            temp_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# Standalone runs write their metrics when the process exits.
+if ENABLED:
+    atexit.register(write)
@@ -0,0 +1,88 @@
+"""
+Optional process pool for the CPU bound HTML parsing.
+
+BeautifulSoup runs on a single core, when the pool is enabled the pages
+downloaded by the bots are parsed in worker processes and only the
+extracted rows are sent back, this way all the cores of the Raspberry Pi
+are used. Set the BOT_PARSE_WORKERS environment variable to the number
+of worker processes to enable it, otherwise pages are parsed in the
+calling thread.
+
+The workers are forked, so the pool must be started before any thread
+and the parse functions must be defined at the top level of a module.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+WORKERS = int(os.environ.get("BOT_PARSE_WORKERS") or 0)
+
+executor = None
+lock = threading.Lock()
+
+
+def start(workers=None):
+    """Starts the worker processes, it does nothing if the pool is disabled or already started.
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes, by default BOT_PARSE_WORKERS.
+
+    """
+
+    global executor
+
+    workers = WORKERS if workers is None else workers
+
+    # Only fork is used, the other start methods can't import the bots
+    # loaded by the scheduler.
+    if workers <= 0 or "fork" not in multiprocessing.get_all_start_methods():
+        return
+
+    with lock:
+        if executor is not None:
+            return
+
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("fork"))
+
+        # The first task forks all the workers now, before the bots start their threads.
+        executor.submit(int).result()
+
+
+def stop():
+    """Stops the worker processes."""
+
+    global executor
+
+    with lock:
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+
+
+def run(func, *args):
+    """Runs a parse function in the pool, or in the calling thread if the pool isn't started.
+
+    Parameters
+    ----------
+    func : function
+        A top level function that returns plain data (tuples, lists, numbers or strings).
+
+    args
+        The function arguments, usually the page contents.
+
+    Returns
+    -------
+    object
+        The value returned by the function.
+
+    """
+
+    if executor is None:
+        return func(*args)
+
+    return executor.submit(func, *args).result()
@@ -0,0 +1,147 @@
+"""
+Shared Reddit session.
+
+All the bots get their Reddit instance from here, when several bots run
+in the same process (see scheduler.py) they share a single session.
+
+The access token is saved to disk with its expiration time and reused by
+the next runs, this way the password grant is only requested once the
+token expires instead of on every run.
+"""
+
+import json
+import os
+import time
+
+import config
+import metrics
+
+TOKEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".reddit_token.json")
+
+# Saved tokens are not used during their last seconds.
+TOKEN_MARGIN = 60
+
+# Extra praw.Reddit() arguments, for example the oauth_url and reddit_url
+# of a local test server (see benchmarks/load.py).
+OPTIONS = dict()
+
+reddit = None
+
+
+def get_reddit():
+    """Creates the Reddit instance the first time it is requested.
+
+    Returns
+    -------
+    Reddit
+        A Reddit instance.
+
+    """
+
+    global reddit
+
+    if reddit is None:
+
+        # PRAW is imported here so code paths that don't use Reddit don't pay for it.
+        import praw
+
+        reddit = praw.Reddit(client_id=config.APP_ID, client_secret=config.APP_SECRET,
+                             user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
+                             password=config.REDDIT_PASSWORD, **OPTIONS)
+
+        authorizer = reddit._core._authorizer
+        load_token(authorizer)
+
+        # Save every new token obtained by the authorizer.
+        refresh = authorizer.refresh
+
+        def refresh_and_save():
+            before = getattr(authorizer, "_expiration_timestamp_ns", None)
+            with metrics.timer("reddit_token_refresh"):
+                refresh()
+
+            save_token(authorizer, getattr(authorizer, "_expiration_timestamp_ns", None) != before)
+
+        authorizer.refresh = refresh_and_save
+
+    return reddit
+
+
+def token_owner():
+    """Identifies the app and account the saved token belongs to.
+
+    Returns
+    -------
+    str
+        The app id and the username.
+
+    """
+
+    return "{}:{}".format(config.APP_ID, config.REDDIT_USERNAME)
+
+
+def load_token(authorizer):
+    """Loads the saved access token into the authorizer if it's still valid.
+
+    Parameters
+    ----------
+    authorizer : prawcore.ScriptAuthorizer
+        The authorizer of the Reddit instance.
+
+    """
+
+    try:
+        with open(TOKEN_FILE, "r", encoding="utf-8") as temp_file:
+            token = json.load(temp_file)
+    except (FileNotFoundError, ValueError):
+        return
+
+    remaining = token.get("expires_at", 0) - time.time() - TOKEN_MARGIN
+
+    if token.get("owner") != token_owner() or remaining <= 0:
+        return
+
+    authorizer.access_token = token["access_token"]
+    authorizer.scopes = set(token["scopes"])
+
+    # Newer prawcore versions use a monotonic clock, older ones the wall clock.
+    authorizer._expiration_timestamp_ns = time.monotonic_ns() + int(remaining * 1e9)
+    authorizer._expiration_timestamp = time.time() + remaining
+
+
+def save_token(authorizer, monotonic):
+    """Saves the access token of the authorizer.
+
+    Parameters
+    ----------
+    authorizer : prawcore.ScriptAuthorizer
+        The authorizer of the Reddit instance.
+
+    monotonic : bool
+        Whether the authorizer expiration uses the monotonic clock.
+
+    """
+
+    if authorizer.access_token is None:
+        return
+
+    if monotonic:
+        expires_at = time.time() + (authorizer._expiration_timestamp_ns - time.monotonic_ns()) / 1e9
+    else:
+        expires_at = authorizer._expiration_timestamp
+
+    token = {
+        "owner": token_owner(),
+        "access_token": authorizer.access_token,
+        "scopes": sorted(authorizer.scopes or []),
+        "expires_at": expires_at
+    }
+
+    # The token is only readable by the current user.
+    temp_name = TOKEN_FILE + ".tmp"
+    descriptor = os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(descriptor, "w", encoding="utf-8") as temp_file:
+        json.dump(token, temp_file)
+
+    os.replace(temp_name, TOKEN_FILE)
@@ -0,0 +1,250 @@
+"""
+Optional long running process that replaces the crontab entries.
+
+Each bot is loaded once and its entry point is called in this process
+following cron-like schedules, this way the interpreter startup, the
+imports and the Reddit login are only paid once. The bots share the
+same Reddit session and HTTP connection pool.
+
+Jobs run one at a time, a job is never started while another run of it
+is in progress and missed runs are coalesced into a single one.
+
+python3 scheduler.py
+"""
+
+import importlib.util
+import os
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Each job has a name, the folder of the bot, the function to call, its
+# arguments and a cron schedule (minute, hour, day of month, month and
+# day of week).
+JOBS = [
+    ("autoposter", "autoposter", "init_bot", [], "0 */6 * * *"),
+    ("financebot", "financebot", "init_bot", [], "0 */3 * * *"),
+    ("coronabot", "coronabot", "main", [], "0 * * * *"),
+    ("stickybot", "stickybot", "run_schedule", [], "*/15 * * * *")
+]
+
+
+def parse_field(field, low, high):
+    """Parses a single cron field.
+
+    Supports *, numbers, ranges (a-b), steps (*/n, a-b/n) and lists (a,b).
+
+    Parameters
+    ----------
+    field : str
+        The cron field.
+
+    low : int
+        The lowest allowed value.
+
+    high : int
+        The highest allowed value.
+
+    Returns
+    -------
+    set
+        The values that match the field.
+
+    """
+
+    values = set()
+
+    for part in field.split(","):
+
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        else:
+            step = 1
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = [int(value) for value in part.split("-")]
+        else:
+            start = end = int(part)
+
+        if start < low or end > high:
+            raise ValueError("Invalid cron field: {}".format(field))
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+def parse_schedule(schedule):
+    """Parses a cron schedule.
+
+    Parameters
+    ----------
+    schedule : str
+        A cron schedule with 5 fields.
+
+    Returns
+    -------
+    tuple
+        The sets of minutes, hours, days of month, months and days of week,
+        plus whether the day of month and day of week fields were restricted.
+
+    """
+
+    minute, hour, day, month, weekday = schedule.split()
+
+    # Sunday can be written as 0 or 7.
+    weekdays = parse_field(weekday, 0, 7)
+
+    if 7 in weekdays:
+        weekdays.add(0)
+
+    return (parse_field(minute, 0, 59), parse_field(hour, 0, 23), parse_field(day, 1, 31),
+            parse_field(month, 1, 12), weekdays, day != "*", weekday != "*")
+
+
+def is_due(parsed_schedule, moment):
+    """Checks if a schedule matches the given minute.
+
+    Parameters
+    ----------
+    parsed_schedule : tuple
+        The value returned by parse_schedule().
+
+    moment : datetime
+        The minute to check.
+
+    Returns
+    -------
+    bool
+        True if the job must run on that minute.
+
+    """
+
+    minutes, hours, days, months, weekdays, day_set, weekday_set = parsed_schedule
+
+    if moment.minute not in minutes or moment.hour not in hours or moment.month not in months:
+        return False
+
+    day_match = moment.day in days
+    weekday_match = moment.isoweekday() % 7 in weekdays
+
+    # Like cron, when both fields are restricted either of them can match.
+    if day_set and weekday_set:
+        return day_match or weekday_match
+
+    return day_match and weekday_match
+
+
+def load_bot(folder):
+    """Loads the bot.py module of the given folder.
+
+    Parameters
+    ----------
+    folder : str
+        The folder of the bot.
+
+    Returns
+    -------
+    module
+        The bot module.
+
+    """
+
+    spec = importlib.util.spec_from_file_location(
+        "{}_bot".format(folder), os.path.join(ROOT, folder, "bot.py"))
+
+    module = importlib.util.module_from_spec(spec)
+
+    # Registered so its functions can be sent to the parse workers.
+    sys.modules[spec.name] = module
+
+    os.chdir(os.path.join(ROOT, folder))
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def run_job(job, module):
+    """Runs a job from the bot folder, errors are printed and don't stop the scheduler.
+
+    Parameters
+    ----------
+    job : tuple
+        The job definition.
+
+    module : module
+        The bot module.
+
+    """
+
+    name, folder, entry, args, _ = job
+
+    print("{:%Y-%m-%d %H:%M:%S} Running {}".format(datetime.now(), name))
+    start = time.monotonic()
+
+    # The bots read and write their files relative to their folder.
+    os.chdir(os.path.join(ROOT, folder))
+
+    try:
+        getattr(module, entry)(*args)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        os.chdir(ROOT)
+        metrics.write(name)
+
+    print("{:%Y-%m-%d %H:%M:%S} Finished {} in {:.1f}s".format(
+        datetime.now(), name, time.monotonic() - start))
+
+
+def main():
+    """Loads the bots and runs their jobs forever."""
+
+    modules = dict()
+
+    for job in JOBS:
+        if job[1] not in modules:
+            modules[job[1]] = load_bot(job[1])
+
+    os.chdir(ROOT)
+
+    schedules = [parse_schedule(job[4]) for job in JOBS]
+    last_checked = datetime.now().replace(second=0, microsecond=0)
+
+    while True:
+
+        # Sleep until the start of the next minute.
+        next_minute = last_checked + timedelta(minutes=1)
+        time.sleep(max(0, (next_minute - datetime.now()).total_seconds()))
+
+        now = datetime.now().replace(second=0, microsecond=0)
+        due = list()
+
+        # We check every minute since the last check, jobs that were due
+        # more than once while another job was running only run once.
+        moment = last_checked + timedelta(minutes=1)
+
+        while moment <= now:
+            for i, parsed_schedule in enumerate(schedules):
+                if i not in due and is_due(parsed_schedule, moment):
+                    due.append(i)
+
+            moment += timedelta(minutes=1)
+
+        last_checked = now
+
+        for i in due:
+            run_job(JOBS[i], modules[JOBS[i][1]])
+
+
+if __name__ == "__main__":
+
+    main()
@@ -3,207 +3,512 @@ This bot automates the process of making posts and sticky/unsticking them.
 """
 
 
+import json
+import os
 import random
 import sys
-from datetime import datetime
-import os
-import praw
+from datetime import datetime, timedelta
 
 import config
+import redditclient
+import writequeue
+
+STATE_FILE = "./state.json"
 
+# Files used by previous versions, they are migrated to the state file.
 MONDAY_FILE = "./monday.txt"
 WEDNESDAY_FILE = "./wednesday.txt"
 FRIDAY_FILE = "./friday.txt"
+PROCESSED_POLITICIANS_FILE = "./processed_politicians.txt"
 
 MONDAY_TEMPLATE_FILE = "./templates/monday_template.txt"
 WEDNESDAY_TEMPLATE_FILE = "./templates/wednesday_template.txt"
 FRIDAY_TEMPLATE_FILE = "./templates/friday_template.txt"
 
 POLITICIANS_FILE = "./politicians.txt"
-PROCESSED_POLITICIANS_FILE = "./processed_politicians.txt"
-
-
-def init_bot():
-    """Inits the bot, reads the system arguments and chooses the correct function."""
-
-    # We create the Reddit instance.
-    reddit = praw.Reddit(client_id=config.APP_ID, client_secret=config.APP_SECRET,
-                         user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
-                         password=config.REDDIT_PASSWORD)
-
-    # Check if we have the 3 required arguments.
-    if len(sys.argv) == 3:
 
-        method = sys.argv[1]
-        day = sys.argv[2]
 
-        if method == "sticky":
-            if day == "monday":
-                post_monday(reddit)
-            elif day == "wednesday":
-                post_wednesday(reddit)
-            elif day == "friday":
-                post_friday(reddit)
-
-        elif method == "unsticky":
-            if day == "monday":
-                unsticky_post(reddit, MONDAY_FILE)
-            elif day == "wednesday":
-                unsticky_post(reddit, WEDNESDAY_FILE)
-            elif day == "friday":
-                unsticky_post(reddit, FRIDAY_FILE)
-
-
-def post_monday(reddit):
-    """Posts and stickies the Monday discussion.
+def get_monday_values(reddit, state):
+    """Gets the title and placeholders of the Monday discussion.
 
     Parameters
     ----------
-    reddi : Reddit
+    reddit : Reddit
         A Reddit instance.
 
+    state : dict
+        The bot state.
+
+    Returns
+    -------
+    tuple
+        The title and a dict of placeholders and their values.
+
     """
 
     posts_text = ""
 
     # Take the top 3 posts from last week and add them to the submission text.
-    for submission in reddit.subreddit(config.SUBREDDIT).top("week", limit=3):
+    for submission in reddit.subreddit(config.SUBREDDIT).top(time_filter="week", limit=3):
         posts_text += "* [{}](https://redd.it/{})\n".format(
             submission.title, submission.id)
 
     title = "¿Qué sucedió en tu estado la semana pasada? Semana {}".format(
         datetime.now().strftime("%V"))
 
-    text = open(MONDAY_TEMPLATE_FILE, "r",
-                encoding="utf-8").read().replace("%POSTS_LIST%", posts_text)
-
-    # Submit the text, sticky it and update the log.
-    current_submission = reddit.subreddit(config.SUBREDDIT).submit(
-        title=title, selftext=text)
-
-    reddit.submission(current_submission).mod.sticky()
-    update_log(MONDAY_FILE, current_submission.id)
+    return title, {"%POSTS_LIST%": posts_text}
 
 
-def post_wednesday(reddit):
-    """Posts and stickies the Wednesday discussion.
+def get_wednesday_values(reddit, state):
+    """Gets the title and placeholders of the Wednesday discussion.
 
     A random politician is taken from a pool of available
-    people.
+    people, once all of them were used the pool is reset. The
+    politician is added to the state once the post is made.
 
     Parameters
     ----------
-    reddi : Reddit
+    reddit : Reddit
         A Reddit instance.
 
+    state : dict
+        The bot state.
+
+    Returns
+    -------
+    tuple
+        The title and a dict of placeholders and their values.
+
     """
 
     politicians = open(POLITICIANS_FILE, "r",
                        encoding="utf-8").read().splitlines()
 
-    for item in load_processed_politicians():
-        politicians.remove(item)
+    available = [item for item in politicians if item not in state["politicians"]]
 
-    # If our pool is empty we reset the file and try again.
-    if len(politicians) == 0:
-        os.remove(PROCESSED_POLITICIANS_FILE)
-        post_wednesday(reddit)
+    # If our pool is empty we reset it.
+    if len(available) == 0:
+        available = politicians
 
-    selected_politician = random.choice(politicians)
+    selected_politician = random.choice(available)
 
     title = "Discusión Semanal - {}".format(selected_politician)
 
-    text = open(WEDNESDAY_TEMPLATE_FILE, "r",
-                encoding="utf-8").read().replace("%POLITICIAN%", selected_politician)
+    return title, {"%POLITICIAN%": selected_politician}
+
+
+def get_friday_values(reddit, state):
+    """Gets the title and placeholders of the Friday discussion.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    state : dict
+        The bot state.
+
+    Returns
+    -------
+    tuple
+        The title and a dict of placeholders and their values.
+
+    """
+
+    return "¿Qué planes tienes para este fin de semana?", dict()
+
+
+# Each thread has a name, its template, the function that gets its title and
+# placeholders, when it's posted and when it's unstickied. Times are a
+# (weekday, hour, minute) tuple where Monday is 0 and Sunday is 6.
+THREADS = [
+    ("monday", MONDAY_TEMPLATE_FILE, get_monday_values, (0, 9, 0), (1, 21, 0)),
+    ("wednesday", WEDNESDAY_TEMPLATE_FILE, get_wednesday_values, (2, 9, 0), (3, 21, 0)),
+    ("friday", FRIDAY_TEMPLATE_FILE, get_friday_values, (4, 9, 0), (5, 21, 0))
+]
 
-    # Submit the text, sticky it and update the log.
-    current_submission = reddit.subreddit(config.SUBREDDIT).submit(
-        title=title, selftext=text)
 
-    reddit.submission(current_submission).mod.sticky()
-    update_log(WEDNESDAY_FILE, current_submission.id)
-    update_processed_politicians(selected_politician)
+def init_bot():
+    """Inits the bot, reads the system arguments and chooses the correct function."""
+
+    # A single argument runs every due action, 2 arguments run a single action.
+    if len(sys.argv) == 2 and sys.argv[1] == "run":
+        run_schedule()
+    elif len(sys.argv) == 3:
+        run_action(sys.argv[1], sys.argv[2])
 
 
-def post_friday(reddit):
-    """Posts and stickies the Friday discussion.
+def load_state():
+    """Loads the bot state, migrating the files of previous versions.
+
+    Returns
+    -------
+    dict
+        The post id, post time and sticky status of each thread and
+        the politicians already discussed.
+
+    """
+
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+
+    except (FileNotFoundError, ValueError):
+        pass
+
+    state = {"threads": dict(), "politicians": list()}
+
+    for name, file_name in [("monday", MONDAY_FILE), ("wednesday", WEDNESDAY_FILE),
+                            ("friday", FRIDAY_FILE)]:
+        try:
+            with open(file_name, "r", encoding="utf-8") as temp_file:
+                post_id = temp_file.read().strip()
+        except FileNotFoundError:
+            continue
+
+        # The old files don't say when the post was made, we use their modification time.
+        posted_at = datetime.fromtimestamp(os.path.getmtime(file_name))
+
+        state["threads"][name] = {
+            "post_id": post_id,
+            "posted_at": posted_at.isoformat(),
+            "stickied": True
+        }
+
+    try:
+        with open(PROCESSED_POLITICIANS_FILE, "r", encoding="utf-8") as temp_file:
+            state["politicians"] = temp_file.read().splitlines()
+    except FileNotFoundError:
+        pass
+
+    return state
+
+
+def save_state(state):
+    """Saves the bot state.
 
     Parameters
     ----------
-    reddi : Reddit
-        A Reddit instance.
+    state : dict
+        The bot state.
 
     """
 
-    title = "¿Qué planes tienes para este fin de semana?"
-    text = open(FRIDAY_TEMPLATE_FILE, "r", encoding="utf-8").read()
+    temp_name = STATE_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(state, temp_file, ensure_ascii=False)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+    os.replace(temp_name, STATE_FILE)
+
+
+def get_thread(day):
+    """Gets the definition of a thread.
 
-    # Submit the text, sticky it and update the log.
-    current_submission = reddit.subreddit(config.SUBREDDIT).submit(
-        title=title, selftext=text)
+    Parameters
+    ----------
+    day : str
+        monday, wednesday or friday.
+
+    Returns
+    -------
+    tuple
+        The thread definition.
+
+    """
 
-    reddit.submission(current_submission).mod.sticky()
-    update_log(FRIDAY_FILE, current_submission.id)
+    for thread in THREADS:
+        if thread[0] == day:
+            return thread
 
+    raise ValueError("Unknown thread: {}".format(day))
 
-def update_log(file_name, post_id):
-    """Updates the processed posts log with the given post id.
+
+def run_action(method, day):
+    """Runs the sticky or unsticky action of the specified day.
 
     Parameters
     ----------
-    post_id : str
-        A Reddit post id.
+    method : str
+        sticky or unsticky.
+
+    day : str
+        monday, wednesday or friday.
 
     """
 
-    with open(file_name, "w", encoding="utf-8") as log_file:
-        log_file.write(post_id)
+    # We get the shared Reddit instance.
+    reddit = redditclient.get_reddit()
+
+    state = load_state()
+    thread = get_thread(day)
 
+    if method == "sticky":
+        post_thread(reddit, state, thread, datetime.now())
+    elif method == "unsticky":
+        unsticky_thread(reddit, state, thread)
 
-def unsticky_post(reddit, file_name):
-    """Unstickies the specified day post.
+
+def last_occurrence(moment, weekly_time):
+    """Gets the last time a weekly schedule was due.
+
+    Parameters
+    ----------
+    moment : datetime
+        The current time.
+
+    weekly_time : tuple
+        The weekday, hour and minute.
+
+    Returns
+    -------
+    datetime
+        The last time at or before moment.
+
+    """
+
+    weekday, hour, minute = weekly_time
+
+    occurrence = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    occurrence -= timedelta(days=(moment.weekday() - weekday) % 7)
+
+    if occurrence > moment:
+        occurrence -= timedelta(days=7)
+
+    return occurrence
+
+
+def get_due_actions(state, now):
+    """Gets every action that is due or was missed since it was last run.
+
+    A post is only due while its sticky window is open, if the bot was
+    down for the whole window the post is skipped.
+
+    Parameters
+    ----------
+    state : dict
+        The bot state.
+
+    now : datetime
+        The current time.
+
+    Returns
+    -------
+    list
+        A list of (time, method, thread) sorted by time.
+
+    """
+
+    actions = list()
+
+    for thread in THREADS:
+
+        name, _, _, post_time, unsticky_time = thread
+        thread_state = state["threads"].get(name, dict())
+
+        post_at = last_occurrence(now, post_time)
+        unsticky_at = last_occurrence(now, unsticky_time)
+
+        posted_at = thread_state.get("posted_at")
+        posted_at = datetime.fromisoformat(posted_at) if posted_at else datetime.min
+
+        if thread_state.get("stickied") and unsticky_at > posted_at:
+            actions.append((unsticky_at, "unsticky", thread))
+
+        if post_at > posted_at and post_at > unsticky_at:
+            actions.append((post_at, "sticky", thread))
+
+    actions.sort(key=lambda action: action[0])
+
+    return actions
+
+
+def run_schedule():
+    """Runs every due sticky and unsticky action with a single Reddit session."""
+
+    state = load_state()
+    now = datetime.now()
+
+    actions = get_due_actions(state, now)
+
+    if not actions:
+        print("No actions are due.")
+        return
+
+    # We get the shared Reddit instance.
+    reddit = redditclient.get_reddit()
+
+    for due_at, method, thread in actions:
+
+        print("Running {} {} due at {:%Y-%m-%d %H:%M}".format(method, thread[0], due_at))
+
+        # A failed action is retried on the next run, the rest still run.
+        try:
+            if method == "sticky":
+                post_thread(reddit, state, thread, due_at)
+            else:
+                unsticky_thread(reddit, state, thread)
+        except Exception as error:
+            print("Failed to {} {}: {}".format(method, thread[0], error))
+
+
+def post_thread(reddit, state, thread, due_at):
+    """Posts and stickies a discussion thread.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    state : dict
+        The bot state, it's saved after the post is made.
+
+    thread : tuple
+        The thread definition.
+
+    due_at : datetime
+        When the post was due.
+
+    """
+
+    name, template_file, get_values, _, _ = thread
+
+    pending = writequeue.get_pending("sticky/{}".format(name))
+
+    # A post left in the queue by a previous run may already be submitted,
+    # it's finished instead of building a new one.
+    if pending is not None:
+        politician = pending["params"].get("politician")
+        post_id = flush_sticky(reddit, name)
+    else:
+        title, placeholders = get_values(reddit, state)
+        politician = placeholders.get("%POLITICIAN%")
+        text = open(template_file, "r", encoding="utf-8").read()
+
+        for placeholder, value in placeholders.items():
+            text = text.replace(placeholder, value)
+
+        # Submit the text, sticky it and update the state.
+        post_id = submit_sticky(reddit, name, title, text, politician)
+
+    state["threads"][name] = {
+        "post_id": post_id,
+        "posted_at": due_at.isoformat(),
+        "stickied": True
+    }
+
+    if politician is not None:
+        # Choosing a politician that was already discussed means the pool was reset.
+        if politician in state["politicians"]:
+            state["politicians"] = list()
+
+        state["politicians"].append(politician)
+
+    save_state(state)
+
+
+def submit_sticky(reddit, day, title, text, politician=None):
+    """Submits a text post and stickies it through the write queue.
 
     Parameters
     ----------
     reddit : Reddit
         A Reddit instance.
 
-    file_name : str
-        The file name to read the post id from.
+    day : str
+        monday, wednesday or friday.
+
+    title : str
+        The title of the post.
+
+    text : str
+        The text of the post.
+
+    politician : str
+        The politician of the post, it's kept with the queued write
+        and added to the state once the post is made.
+
+    Returns
+    -------
+    str
+        The id of the new post.
 
     """
 
-    with open(file_name, "r", encoding="utf-8") as temp_file:
-        post_id = temp_file.read().strip()
-        reddit.submission(post_id).mod.sticky(state=False)
+    writequeue.enqueue("sticky/{}".format(day), "submit", subreddit=config.SUBREDDIT,
+                       title=title, selftext=text, sticky=True, politician=politician)
+
+    return flush_sticky(reddit, day)
+
+
+def flush_sticky(reddit, day):
+    """Makes the pending writes and returns the id of the queued post.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    day : str
+        monday, wednesday or friday.
 
+    Returns
+    -------
+    str
+        The id of the post.
 
-def load_processed_politicians():
-    """Load the names of the politicians that have been
-    already posted.
     """
 
-    try:
-        with open(PROCESSED_POLITICIANS_FILE, "r", encoding="utf-8") as temp_file:
-            return temp_file.read().splitlines()
+    key = "sticky/{}".format(day)
 
-    except FileNotFoundError:
-        with open(PROCESSED_POLITICIANS_FILE, "w", encoding="utf-8") as temp_file:
-            return []
+    results, errors = writequeue.flush(reddit)
+
+    if key in errors:
+        raise errors[key]
+
+    if key not in results:
+        raise RuntimeError("The {} post was left in the queue for the next run.".format(day))
+
+    return results[key]
 
 
-def update_processed_politicians(politician):
-    """Updates the processed posts log with the given post id.
+def unsticky_thread(reddit, state, thread):
+    """Unstickies the last post of a discussion thread.
 
     Parameters
     ----------
-    politican : str
-        A politician name.
+    reddit : Reddit
+        A Reddit instance.
+
+    state : dict
+        The bot state, it's saved after the post is unstickied.
+
+    thread : tuple
+        The thread definition.
 
     """
 
-    with open(PROCESSED_POLITICIANS_FILE, "a", encoding="utf-8") as temp_file:
-        temp_file.write(politician + "\n")
+    thread_state = state["threads"].get(thread[0])
+
+    if not thread_state:
+        print("There is no {} post to unsticky.".format(thread[0]))
+        return
+
+    key = "unsticky/{}".format(thread_state["post_id"])
+    writequeue.enqueue(key, "sticky", submission_id=thread_state["post_id"], state=False)
+
+    results, errors = writequeue.flush(reddit)
+
+    if key in errors:
+        raise errors[key]
+
+    if key not in results:
+        raise RuntimeError("The {} unsticky was left in the queue for the next run.".format(thread[0]))
+
+    thread_state["stickied"] = False
+    save_state(state)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""
+Tests the CoronaBot chronology parser and the section cache against a
+local stand-in for Wikipedia.
+
+python3 -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import scheduler
+
+PAGE = """<html><body>
+<h2><span id="Cronología">Cronología</span></h2>
+<h3>{day}</h3>
+<p>Primer caso.<sup>[1]</sup></p>
+<h2>Referencias</h2>
+</body></html>"""
+
+# New style headings, with a gallery, a caption and a nested list inside the section.
+NESTED_PAGE = """<div class="mw-parser-output">
+<div class="mw-heading mw-heading2"><h2 id="Cronología">Cronología</h2>
+<span class="mw-editsection">[editar]</span></div>
+<div class="mw-heading mw-heading3"><h3>1 de marzo</h3>
+<span class="mw-editsection"><a href="#">editar</a></span></div>
+<p>Primer caso.<sup>[1]</sup></p>
+<ul><li>Jalisco</li><li>Puebla</li></ul>
+<ul class="gallery"><li class="gallerybox"><p>Foto</p></li></ul>
+<div class="thumb"><p>Pie de foto</p></div>
+<div class="notice"><p>Aviso</p><ul><li>Dentro de un div</li></ul></div>
+<p>Segundo caso.</p>
+</div>
+<p>Fuera de la sección</p>
+<div class="mw-heading mw-heading2"><h2 id="Referencias">Referencias</h2></div>"""
+
+
+class WikipediaHandler(BaseHTTPRequestHandler):
+    """Serves the page info API and a chronology page from the server state."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        state = self.server.state
+
+        if url.path == "/w/api.php":
+            params = parse_qs(url.query)
+            state["api_requests"].append(params)
+
+            body = json.dumps({"query": {"pages": [{
+                "title": params["titles"][0],
+                "lastrevid": state["lastrevid"],
+                "touched": state["touched"]
+            }]}})
+
+            content_type = "application/json"
+
+        elif url.path.startswith("/wiki/"):
+            state["page_requests"] += 1
+            body = PAGE.format(day=state["day"])
+            content_type = "text/html; charset=utf-8"
+
+        else:
+            self.send_error(404)
+            return
+
+        data = body.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ChronologyParserTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cwd = os.getcwd()
+        cls.bot = scheduler.load_bot("coronabot")
+        os.chdir(cwd)
+
+    def test_only_top_level_elements_are_kept(self):
+        # Small chunks split the tags and the text.
+        chunks = [NESTED_PAGE[i:i + 7] for i in range(0, len(NESTED_PAGE), 7)]
+
+        self.assertEqual(self.bot.parse_chronology(chunks), [
+            ["h3", "1 de marzo"],
+            ["p", "Primer caso."],
+            ["p", "Jalisco"],
+            ["p", "Puebla"],
+            ["p", "Segundo caso."]
+        ])
+
+    def test_missing_section(self):
+        with self.assertRaises(ValueError):
+            self.bot.parse_chronology(["<html><body><p>Nada</p></body></html>"])
+
+
+class SectionCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cwd = os.getcwd()
+        cls.bot = scheduler.load_bot("coronabot")
+        os.chdir(cwd)
+
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), WikipediaHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+        cls.url = "http://127.0.0.1:{}/wiki/Cronolog%C3%ADa".format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.state = {
+            "lastrevid": 100,
+            "touched": "2020-04-01T00:00:00Z",
+            "day": "1 de abril",
+            "api_requests": list(),
+            "page_requests": 0
+        }
+
+        self.original_url = self.bot.CHRONOLOGY_URL
+        self.bot.CHRONOLOGY_URL = self.url
+        self.bot.WIKIPEDIA_SECTIONS["chronology"] = self.url
+
+    def tearDown(self):
+        self.bot.CHRONOLOGY_URL = self.original_url
+        self.bot.WIKIPEDIA_SECTIONS["chronology"] = self.original_url
+
+    def get_section(self, cached):
+        return self.bot.get_section("chronology", self.bot.get_chronology_data,
+                                    self.bot.render_chronology, cached)
+
+    def test_revision(self):
+        revision = self.bot.get_revision(self.url)
+
+        self.assertEqual(revision, "100/2020-04-01T00:00:00Z")
+        self.assertEqual(self.server.state["api_requests"][0]["titles"], ["Cronología"])
+
+    def test_unchanged_page_is_not_downloaded(self):
+        section = self.get_section(None)
+        self.assertEqual(self.server.state["page_requests"], 1)
+
+        self.assertIs(self.get_section(section), section)
+        self.assertEqual(self.server.state["page_requests"], 1)
+
+    def test_edited_page_is_downloaded(self):
+        section = self.get_section(None)
+
+        self.server.state["lastrevid"] = 101
+        self.server.state["day"] = "2 de abril"
+
+        updated = self.get_section(section)
+
+        self.assertEqual(self.server.state["page_requests"], 2)
+        self.assertEqual(updated["text"], "#### 2 de abril\n\n> Primer caso.\n\n")
+        self.assertNotEqual(updated["revision"], section["revision"])
+
+    def test_edited_template_is_downloaded(self):
+        section = self.get_section(None)
+
+        # A template edit only changes the touched timestamp.
+        self.server.state["touched"] = "2020-04-02T00:00:00Z"
+        self.server.state["day"] = "2 de abril"
+
+        updated = self.get_section(section)
+
+        self.assertEqual(self.server.state["page_requests"], 2)
+        self.assertIn("2 de abril", updated["text"])
+
+    def test_same_data_keeps_the_rendered_section(self):
+        section = self.get_section(None)
+
+        self.server.state["lastrevid"] = 101
+
+        updated = self.get_section(section)
+
+        self.assertEqual(self.server.state["page_requests"], 2)
+        self.assertEqual(updated["text"], section["text"])
+        self.assertEqual(updated["fingerprint"], section["fingerprint"])
+        self.assertEqual(updated["revision"], "101/2020-04-01T00:00:00Z")
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+Tests that the Banxico values are stored under the date they were published.
+
+python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from unittest import mock
+
+from openpyxl import Workbook
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import scheduler
+
+# The row of the dates in the test workbooks.
+DATE_ROW = 9
+
+
+def make_workbook(columns, rows):
+    """Creates a Banxico style workbook.
+
+    Parameters
+    ----------
+    columns : list
+        The (date, value) of each column, the same value is used for every row.
+
+    rows : list
+        The rows of the instruments.
+
+    Returns
+    -------
+    bytes
+        The xlsx contents.
+
+    """
+
+    book = Workbook()
+    sheet = book.active
+
+    sheet.cell(row=1, column=1, value="Banco de México")
+    sheet.cell(row=DATE_ROW, column=1, value="Fecha")
+
+    for column, (day, value) in enumerate(columns, start=2):
+        sheet.cell(row=DATE_ROW, column=column, value=day.strftime("%d/%m/%Y"))
+
+        for row in rows:
+            sheet.cell(row=row, column=column, value=value)
+
+    content = BytesIO()
+    book.save(content)
+
+    return content.getvalue()
+
+
+class FakeResponse:
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class BanxicoSeriesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cwd = os.getcwd()
+        cls.bot = scheduler.load_bot("financebot")
+        os.chdir(cwd)
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+        self.columns = list()
+        self.requests = 0
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def get(self, url):
+        self.requests += 1
+        rows = {row for _, source, row, _ in self.bot.BANXICO_INSTRUMENTS}
+        return FakeResponse(make_workbook(self.columns, rows))
+
+    def get_cetes(self, now):
+
+        class FakeDatetime(datetime):
+
+            @classmethod
+            def now(cls, tz=None):
+                return now
+
+        with mock.patch.object(self.bot.httpclient, "get", self.get), \
+                mock.patch.object(self.bot, "datetime", FakeDatetime):
+            return {name: (value, change) for name, value, change in self.bot.get_cetes()}
+
+    def test_values_are_stored_under_their_date(self):
+        # A Wednesday at midnight, before that day's values are published.
+        wednesday = date(2024, 6, 12)
+        tuesday = wednesday - timedelta(days=1)
+
+        self.columns = [(tuesday - timedelta(days=7), 10.5), (tuesday, 10.75)]
+        values = self.get_cetes(datetime(2024, 6, 12, 0, 0))
+
+        self.assertEqual(values["CETES 1 mes"], ("+10.75%", ""))
+        self.assertEqual(self.requests, 2)
+
+        series = self.bot.load_series("banxico1", 16)
+        self.assertEqual(list(series), [tuesday.toordinal(), 10.75])
+
+        # Later that day the new values are downloaded, not skipped.
+        self.columns.append((wednesday, 11.0))
+        values = self.get_cetes(datetime(2024, 6, 12, 15, 0))
+
+        self.assertEqual(values["CETES 1 mes"], ("+11.0%", "+0.25"))
+        self.assertEqual(self.requests, 4)
+
+        # Once downloaded after the publish time nothing is downloaded that day.
+        values = self.get_cetes(datetime(2024, 6, 12, 18, 0))
+
+        self.assertEqual(values["CETES 1 mes"], ("+11.0%", "+0.25"))
+        self.assertEqual(self.requests, 4)
+
+    def test_weekly_values_are_downloaded_once_per_publication(self):
+        # CETES are auctioned on Tuesdays, there are no newer dates the rest of the week.
+        tuesday = date(2024, 6, 11)
+        self.columns = [(tuesday, 10.75)]
+
+        self.get_cetes(datetime(2024, 6, 11, 15, 0))
+        self.assertEqual(self.requests, 2)
+
+        # Nothing new is published until the next afternoon.
+        self.get_cetes(datetime(2024, 6, 12, 10, 0))
+        self.assertEqual(self.requests, 2)
+
+        self.get_cetes(datetime(2024, 6, 12, 15, 0))
+        self.get_cetes(datetime(2024, 6, 12, 18, 0))
+        self.assertEqual(self.requests, 4)
+
+        # On weekends the Friday download is kept.
+        self.get_cetes(datetime(2024, 6, 14, 16, 0))
+        self.get_cetes(datetime(2024, 6, 16, 12, 0))
+        self.assertEqual(self.requests, 6)
+        self.assertEqual(len(self.bot.load_series("banxico1", 16)), 2)
+
+    def test_old_values_are_not_stored_again(self):
+        tuesday = date(2024, 6, 11)
+
+        self.columns = [(tuesday, 10.75)]
+        self.get_cetes(datetime(2024, 6, 12, 0, 0))
+        values = self.get_cetes(datetime(2024, 6, 13, 0, 0))
+
+        # The change is only shown against a previously published value.
+        self.assertEqual(values["CETES 1 mes"], ("+10.75%", ""))
+        self.assertEqual(len(self.bot.load_series("banxico1", 16)), 2)
+
+    def test_weekends_use_friday(self):
+        self.assertEqual(self.bot.get_latest_business_day(date(2024, 6, 16)), date(2024, 6, 14))
+        self.assertEqual(self.bot.get_latest_business_day(date(2024, 6, 14)), date(2024, 6, 14))
+
+    def test_latest_publication(self):
+        self.assertEqual(self.bot.get_latest_publication(datetime(2024, 6, 12, 10, 0)),
+                         datetime(2024, 6, 11, 14, 0))
+        self.assertEqual(self.bot.get_latest_publication(datetime(2024, 6, 12, 15, 0)),
+                         datetime(2024, 6, 12, 14, 0))
+        self.assertEqual(self.bot.get_latest_publication(datetime(2024, 6, 17, 9, 0)),
+                         datetime(2024, 6, 14, 14, 0))
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+Tests that the write queue never submits a StickyBot post twice.
+
+python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import prawcore
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import scheduler
+import writequeue
+
+
+def make_response(status_code, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+
+    return response
+
+
+class FakeReddit:
+    """Records the submissions and fails the first sticky requests."""
+
+    def __init__(self, rate_limited_stickies=0, failed_stickies=0):
+        self.submissions = list()
+        self.stickies = list()
+        self.rate_limited_stickies = rate_limited_stickies
+        self.failed_stickies = failed_stickies
+        self._core = SimpleNamespace(_rate_limiter=SimpleNamespace(update=lambda **kwargs: None))
+
+    def subreddit(self, name):
+        return SimpleNamespace(submit=self.submit)
+
+    def submit(self, title, url=None, selftext=None):
+        self.submissions.append(title)
+        return SimpleNamespace(id="post{}".format(len(self.submissions)))
+
+    def submission(self, submission_id):
+
+        def sticky(state=True):
+            if self.rate_limited_stickies:
+                self.rate_limited_stickies -= 1
+
+                raise prawcore.exceptions.TooManyRequests(
+                    make_response(429, **{"retry-after": str(writequeue.MAX_WAIT + 1)}))
+
+            if self.failed_stickies:
+                self.failed_stickies -= 1
+
+                raise prawcore.exceptions.ServerError(make_response(500))
+
+            self.stickies.append((submission_id, state))
+
+        return SimpleNamespace(mod=SimpleNamespace(sticky=sticky))
+
+
+class WriteQueueTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cwd = os.getcwd()
+        cls.bot = scheduler.load_bot("stickybot")
+        os.chdir(cwd)
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+        with open("template.txt", "w", encoding="utf-8") as temp_file:
+            temp_file.write("Hoy es %DAY%")
+
+        self.values = 0
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def get_values(self, reddit, state):
+        self.values += 1
+        return "Hilo {}".format(self.values), {"%DAY%": "miércoles"}
+
+    def test_edits_are_coalesced(self):
+        writequeue.enqueue("wiki/index", "wiki_edit", subreddit="mexico", page="index", content="1")
+        writequeue.enqueue("wiki/index", "wiki_edit", subreddit="mexico", page="index", content="2")
+
+        writes = writequeue.load_pending()
+
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(writes[0]["params"]["content"], "2")
+
+    def test_pending_submission_is_kept(self):
+        writequeue.enqueue("sticky/monday", "submit", subreddit="mexico", title="A", selftext="")
+        writes = writequeue.load_pending()
+        writes[0]["params"]["submission_id"] = "post1"
+        writequeue.save_pending(writes)
+
+        queued = writequeue.enqueue("sticky/monday", "submit", subreddit="mexico", title="B",
+                                    selftext="")
+
+        self.assertFalse(queued)
+        self.assertEqual(writequeue.load_pending(), writes)
+
+    def test_rate_limited_sticky_is_not_posted_again(self):
+        thread = ("wednesday", "template.txt", self.get_values, None, None)
+        state = {"threads": dict()}
+        reddit = FakeReddit(rate_limited_stickies=1)
+
+        with self.assertRaises(RuntimeError):
+            self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+        self.assertEqual(reddit.submissions, ["Hilo 1"])
+        self.assertEqual(reddit.stickies, [])
+
+        # The next run finishes the same post.
+        self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+        self.assertEqual(reddit.submissions, ["Hilo 1"])
+        self.assertEqual(reddit.stickies, [("post1", True)])
+        self.assertEqual(self.values, 1)
+        self.assertEqual(state["threads"]["wednesday"]["post_id"], "post1")
+        self.assertEqual(writequeue.load_pending(), [])
+
+    def test_failed_sticky_is_not_posted_again(self):
+        thread = ("wednesday", "template.txt", self.get_values, None, None)
+        state = {"threads": dict()}
+        reddit = FakeReddit(failed_stickies=1)
+
+        with self.assertRaises(prawcore.exceptions.ServerError):
+            self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+        self.assertEqual(reddit.submissions, ["Hilo 1"])
+        self.assertEqual(writequeue.load_pending()[0]["params"]["submission_id"], "post1")
+
+        # The next run only retries the sticky.
+        self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+        self.assertEqual(reddit.submissions, ["Hilo 1"])
+        self.assertEqual(reddit.stickies, [("post1", True)])
+        self.assertEqual(state["threads"]["wednesday"]["post_id"], "post1")
+        self.assertEqual(writequeue.load_pending(), [])
+
+    def test_politician_is_recorded_when_the_post_is_made(self):
+        with open("politicians.txt", "w", encoding="utf-8") as temp_file:
+            temp_file.write("Ana\nLuis")
+
+        thread = ("wednesday", "template.txt", self.bot.get_wednesday_values, None, None)
+        state = {"threads": dict(), "politicians": ["Ana"]}
+        reddit = FakeReddit(rate_limited_stickies=1)
+
+        with mock.patch.object(self.bot, "POLITICIANS_FILE", "politicians.txt"):
+            with self.assertRaises(RuntimeError):
+                self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+            self.assertEqual(state["politicians"], ["Ana"])
+
+            # The post is finished from the queue on the next run.
+            self.bot.post_thread(reddit, state, thread, self.bot.datetime.now())
+
+        self.assertEqual(reddit.submissions, ["Discusión Semanal - Luis"])
+        self.assertEqual(state["politicians"], ["Ana", "Luis"])
+
+    def test_failed_action_does_not_stop_the_schedule(self):
+        thread = ("wednesday", "template.txt", self.get_values, (2, 9, 0), (3, 21, 0))
+        state = {"threads": {"monday": {"post_id": "old", "posted_at": "2024-06-10T09:00:00",
+                                        "stickied": True}}, "politicians": list()}
+        self.bot.save_state(state)
+
+        def unsticky_thread(reddit, state, thread):
+            raise prawcore.exceptions.ServerError(make_response(500))
+
+        class FakeDatetime(datetime):
+
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(2024, 6, 12, 10, 0)
+
+        reddit = FakeReddit()
+
+        with mock.patch.object(self.bot, "THREADS", [self.bot.THREADS[0], thread]), \
+                mock.patch.object(self.bot, "datetime", FakeDatetime), \
+                mock.patch.object(self.bot, "unsticky_thread", unsticky_thread), \
+                mock.patch.object(self.bot.redditclient, "get_reddit", lambda: reddit):
+            self.bot.run_schedule()
+
+        # The Monday unsticky fails, the Wednesday post is still made.
+        self.assertEqual(reddit.submissions, ["Hilo 1"])
+        self.assertEqual(self.bot.load_state()["threads"]["wednesday"]["post_id"], "post1")
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Skips Reddit writes when the published data didn't change.
+
+A hash of the data portion of each published text (without footers or
+timestamps) is saved per target in a local state file.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+STATE_FILE = "./published.json"
+
+
+def load_state():
+    """Loads the published hashes.
+
+    Returns
+    -------
+    dict
+        A dict of targets and their last published hash and time.
+
+    """
+
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def fingerprint(data):
+    """Hashes the data portion of a text.
+
+    Parameters
+    ----------
+    data : str
+        The data to hash.
+
+    Returns
+    -------
+    str
+        A hex digest.
+
+    """
+
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def has_changed(target, data, max_age=None):
+    """Checks if the data must be published to the target.
+
+    Parameters
+    ----------
+    target : str
+        A name that identifies the wiki page, widget or submission.
+
+    data : str
+        The data portion of the text that is going to be published.
+
+    max_age : int
+        If set, the data is published again after this many seconds
+        even if it didn't change.
+
+    Returns
+    -------
+    bool
+        True if the data changed since the last time it was published.
+
+    """
+
+    entry = load_state().get(target)
+
+    if entry is None or entry["hash"] != fingerprint(data):
+        return True
+
+    if max_age is not None and time.time() - entry["time"] >= max_age:
+        return True
+
+    return False
+
+
+def mark_published(target, data):
+    """Saves the hash of the data that was published to the target.
+
+    Parameters
+    ----------
+    target : str
+        A name that identifies the wiki page, widget or submission.
+
+    data : str
+        The data portion of the text that was published.
+
+    """
+
+    state = load_state()
+    state[target] = {"hash": fingerprint(data), "time": time.time()}
+
+    temp_name = STATE_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(state, temp_file)
+
+    os.replace(temp_name, STATE_FILE)
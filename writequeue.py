@@ -0,0 +1,365 @@
+"""
+Queue for the Reddit writes made by the bots.
+
+Writes (submissions, stickies, wiki, widget and submission edits) are
+saved to a local file before they are made, this way a crash or a rate
+limit doesn't drop them and they are retried on the next run. Repeated
+edits to the same target are coalesced into the latest one, a pending
+submission is never replaced so it can't be posted twice.
+
+The remaining request budget is read from the rate limit headers of the
+Reddit responses and writes wait for the next window when it runs out.
+"""
+
+import json
+import os
+import re
+import time
+
+import metrics
+
+PENDING_FILE = "./pending_writes.json"
+
+# Writes wait for the next rate limit window when fewer requests remain.
+MIN_REMAINING = 5
+
+# Rate limit waits longer than this leave the writes for the next run.
+MAX_WAIT = 300
+
+# How many times a rate limited write is retried during a flush.
+MAX_ATTEMPTS = 3
+
+# Writes of these actions only set the latest contents or state of their
+# target, a newer one replaces the pending one.
+COALESCED_ACTIONS = {"sticky", "edit", "wiki_edit", "widget_update"}
+
+# The rate limit state, updated from the Reddit response headers.
+budget = {"remaining": None, "reset": None}
+
+
+def track_budget(reddit):
+    """Starts reading the rate limit headers of the Reddit responses.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    """
+
+    rate_limiter = reddit._core._rate_limiter
+
+    if getattr(rate_limiter, "tracked_by_writequeue", False):
+        return
+
+    update = rate_limiter.update
+
+    def update_and_track(*args, **kwargs):
+        headers = kwargs.get("response_headers", args[0] if args else {})
+
+        if "x-ratelimit-remaining" in headers:
+            budget["remaining"] = float(headers["x-ratelimit-remaining"])
+            budget["reset"] = time.time() + float(headers["x-ratelimit-reset"])
+
+        return update(*args, **kwargs)
+
+    rate_limiter.update = update_and_track
+    rate_limiter.tracked_by_writequeue = True
+
+
+def load_pending():
+    """Loads the pending writes.
+
+    Returns
+    -------
+    list
+        A list of dicts with the key, action and parameters of each write.
+
+    """
+
+    try:
+        with open(PENDING_FILE, "r", encoding="utf-8") as temp_file:
+            return json.load(temp_file)
+
+    except (FileNotFoundError, ValueError):
+        return list()
+
+
+def save_pending(writes):
+    """Saves the pending writes.
+
+    Parameters
+    ----------
+    writes : list
+        A list of dicts with the key, action and parameters of each write.
+
+    """
+
+    temp_name = PENDING_FILE + ".tmp"
+
+    with open(temp_name, "w", encoding="utf-8") as temp_file:
+        json.dump(writes, temp_file, ensure_ascii=False)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+
+    os.replace(temp_name, PENDING_FILE)
+
+
+def get_pending(key):
+    """Gets the pending write with the given key.
+
+    Parameters
+    ----------
+    key : str
+        The key of the write.
+
+    Returns
+    -------
+    dict
+        The write or None if there isn't one.
+
+    """
+
+    for write in load_pending():
+        if write["key"] == key:
+            return write
+
+    return None
+
+
+def enqueue(key, action, **params):
+    """Adds a write to the queue.
+
+    Edits replace any pending write with the same key. A pending
+    submission with the same key is kept instead, it may already be
+    posted and only be waiting for its sticky.
+
+    Parameters
+    ----------
+    key : str
+        Identifies the target of the write, edits with the same key
+        are coalesced into the latest one.
+
+    action : str
+        One of submit, sticky, edit, wiki_edit or widget_update.
+
+    params
+        The parameters of the action.
+
+    Returns
+    -------
+    bool
+        False if a pending write with the same key was kept instead.
+
+    """
+
+    writes = load_pending()
+
+    for write in writes:
+        if write["key"] == key and not (
+                action in COALESCED_ACTIONS and write["action"] in COALESCED_ACTIONS):
+            return False
+
+    writes = [write for write in writes if write["key"] != key]
+    writes.append({"key": key, "action": action, "params": params})
+    save_pending(writes)
+
+    return True
+
+
+def wait_for_budget():
+    """Sleeps until the next rate limit window if the budget is running out.
+
+    Returns
+    -------
+    bool
+        False if the wait would be too long.
+
+    """
+
+    if budget["remaining"] is None or budget["remaining"] >= MIN_REMAINING:
+        return True
+
+    wait = budget["reset"] - time.time()
+
+    if wait > MAX_WAIT:
+        return False
+
+    if wait > 0:
+        metrics.observe("reddit_budget_wait", wait)
+        time.sleep(wait)
+
+    budget["remaining"] = None
+
+    return True
+
+
+def get_rate_limit_wait(error):
+    """Gets the seconds to wait from a rate limit error.
+
+    Parameters
+    ----------
+    error : Exception
+        The exception raised by PRAW.
+
+    Returns
+    -------
+    float
+        The seconds to wait or None if it isn't a rate limit error.
+
+    """
+
+    import praw
+    import prawcore
+
+    if isinstance(error, prawcore.exceptions.TooManyRequests):
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return 60
+
+    if isinstance(error, praw.exceptions.RedditAPIException):
+        for item in error.items:
+            if item.error_type == "RATELIMIT":
+                amount = re.search(r"(\d+) (millisecond|second|minute)", item.message or "")
+
+                if amount is None:
+                    return 60
+
+                seconds = int(amount.group(1))
+
+                if amount.group(2) == "minute":
+                    seconds *= 60
+                elif amount.group(2) == "millisecond":
+                    seconds = 1
+
+                return seconds
+
+    return None
+
+
+def execute(reddit, write, writes):
+    """Makes a single write.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    write : dict
+        The write to make.
+
+    writes : list
+        All the pending writes, saved again when a submission is made
+        so it isn't submitted twice.
+
+    Returns
+    -------
+    str
+        The submission id for submissions, otherwise the key of the write.
+
+    """
+
+    params = write["params"]
+    action = write["action"]
+
+    if action == "submit":
+
+        if "submission_id" not in params:
+            submission = reddit.subreddit(params["subreddit"]).submit(
+                title=params["title"], url=params.get("url"), selftext=params.get("selftext"))
+
+            params["submission_id"] = submission.id
+            save_pending(writes)
+
+        if params.get("sticky"):
+            reddit.submission(params["submission_id"]).mod.sticky()
+
+        return params["submission_id"]
+
+    if action == "sticky":
+        reddit.submission(params["submission_id"]).mod.sticky(state=params["state"])
+    elif action == "edit":
+        reddit.submission(params["submission_id"]).edit(params["text"])
+    elif action == "wiki_edit":
+        reddit.subreddit(params["subreddit"]).wiki[params["page"]].edit(content=params["content"])
+    elif action == "widget_update":
+        import praw
+
+        subreddit = reddit.subreddit(params["subreddit"])
+        widget = praw.models.TextArea(reddit, dict(params["widget"], subreddit=subreddit))
+        widget.mod.update(text=params["text"])
+    else:
+        raise ValueError("Unknown write action: {}".format(action))
+
+    return write["key"]
+
+
+def flush(reddit):
+    """Makes all the pending writes in order.
+
+    Rate limited writes are retried, if the wait is too long they are
+    kept for the next run. Writes that fail for any other reason are
+    dropped and returned with their error, except submissions that were
+    already posted, they are kept so only their sticky is retried.
+
+    Parameters
+    ----------
+    reddit : Reddit
+        A Reddit instance.
+
+    Returns
+    -------
+    tuple
+        A dict of the keys of the writes that were made and their results
+        and a dict of the keys of the writes that failed and their errors.
+
+    """
+
+    track_budget(reddit)
+
+    writes = load_pending()
+    results = dict()
+    errors = dict()
+    attempts = 0
+    position = 0
+
+    while position < len(writes):
+
+        if not wait_for_budget():
+            print("Rate limit budget exhausted, {} writes left for the next run.".format(len(writes)))
+            break
+
+        write = writes[position]
+
+        try:
+            with metrics.timer("reddit_write", action=write["action"]):
+                results[write["key"]] = execute(reddit, write, writes)
+        except Exception as error:
+            wait = get_rate_limit_wait(error)
+
+            if wait is None:
+                print("Write {} failed: {}".format(write["key"], error))
+                errors[write["key"]] = error
+
+                # The post exists, dropping it would submit a new one on the next run.
+                if "submission_id" in write["params"]:
+                    attempts = 0
+                    position += 1
+                    continue
+            else:
+                metrics.count("reddit_rate_limited")
+                attempts += 1
+
+                if wait > MAX_WAIT or attempts >= MAX_ATTEMPTS:
+                    print("Rate limited, {} writes left for the next run.".format(len(writes)))
+                    break
+
+                time.sleep(wait)
+                continue
+
+        attempts = 0
+        writes.pop(position)
+        save_pending(writes)
+
+    return results, errors